@@ -1,4 +1,6 @@
 # config/config.py
+from pathlib import Path
+
 TIMEFRAMES = ["15s", "30s", "1min", "3min", "5min"]
 MACD_PARAMS = {
     "15s": [(12, 26, 9), (24, 52, 18), (48, 104, 36), (144, 312, 108), (240, 520, 180), (720, 1560, 540), (1440, 3120, 1080)],
@@ -14,4 +16,15 @@ HIGHER_TIMEFRAMES = {
     "3min": ["5min", "15min", "30min", "1H", "3H", "1D"],
     "5min": ["15min", "30min", "1H", "3H", "1D", "1W"],
 }
-SYMBOLS_FILE = "config/symbols/nse_100.csv"
\ No newline at end of file
+SYMBOLS_FILE = "config/symbols/nse_100.csv"
+# Fyers REST pacing shared by every backfill request
+API_RATE_LIMIT = 3  # requests per second
+BACKFILL_CONCURRENCY = 8  # symbols processed concurrently
+IO_POOL_WORKERS = 32  # threads for blocking Fyers SDK calls
+QUOTES_BATCH_SIZE = 50  # Fyers quotes API accepts at most 50 symbols per call
+NSE_HOLIDAYS_FILE = Path(__file__).with_name("nse_holidays.csv")  # fallback holiday list when pandas_market_calendars is absent
+SYMBOL_CACHE_TTL = 24 * 60 * 60  # seconds a validated symbol list is reused before re-checking quotes
+TICK_RING_CAPACITY = 1 << 18  # ticks buffered between resampler drains, across all symbols
+OHLCV_BUFFER_CAPACITY = 1 << 15  # 1s bars kept in memory per symbol (~9h, a full session)
+INDICATOR_WORKERS = 8  # threads computing per-symbol MACD/CAL INPUT each resample pass
+HDF5_COMPRESSION = "blosc:lz4"  # HDF5 codec for every store; blosc:zstd packs archives tighter at more CPU
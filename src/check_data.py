@@ -1,5 +1,6 @@
 import pandas as pd
 from pathlib import Path
+from src.data_pipeline.storage import HDF5_CHUNK_CACHE
 
 historical_path = Path(r"C:\Users\mubas\OneDrive\Desktop\macd_pipeline\data\ticks\historical")
 timeframes = ["1min", "3min", "5min"]
@@ -9,11 +10,12 @@ key = symbol.replace(":", "_")
 for tf in timeframes:
     file_path = historical_path / f"{tf}.h5"
     if file_path.exists():
-        with pd.HDFStore(file_path, mode='r') as store:
+        with pd.HDFStore(file_path, mode='r', **HDF5_CHUNK_CACHE) as store:
             if f"/{key}" in store:
-                df = store[key]
-                print(f"{tf} data for {symbol}: {len(df)} rows")
-                print(f"Timestamp range: {df['timestamp'].min()} to {df['timestamp'].max()}")
+                nrows = store.get_storer(key).nrows
+                ts = store.select(key, columns=["timestamp"])["timestamp"]
+                print(f"{tf} data for {symbol}: {nrows} rows")
+                print(f"Timestamp range: {ts.min()} to {ts.max()}")
             else:
                 print(f"No data for {symbol} in {tf}.h5")
     else:
@@ -1,19 +1,112 @@
 import asyncio
 import pandas as pd
+import numpy as np
+import json
 import logging
 import time
+import functools
 import os
-from typing import List, Dict, Any, cast
-from collections.abc import Sequence
+import shutil
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, DefaultDict, Any, Optional, Tuple
 from pathlib import Path
 from fyers_apiv3 import fyersModel
+try:
+    from numba import njit
+except ImportError:  # numba is optional; gap scans fall back to NumPy
+    njit = None
+try:
+    import pandas_market_calendars as mcal
+except ImportError:  # optional; the holiday file in config/ is used instead
+    mcal = None
 from src.utils.config_loader import load_config
 from src.utils.fyers_auth_ngrok import load_tokens
-from src.data_pipeline.storage import Storage
-from config.config import SYMBOLS_FILE
+from src.utils.rate_limiter import AsyncRateLimiter
+from src.utils.retry import backoff
+from src.utils.http_pool import pool_fyers_http
+from src.data_pipeline.storage import Storage, epoch_to_ist
+from config.config import SYMBOLS_FILE, API_RATE_LIMIT, BACKFILL_CONCURRENCY, IO_POOL_WORKERS, QUOTES_BATCH_SIZE, NSE_HOLIDAYS_FILE, SYMBOL_CACHE_TTL
 
 logger = logging.getLogger(__name__)
 
+CANDLE_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+
+def _load_nse_holidays() -> np.ndarray:
+    """NSE holidays from the maintained XNSE calendar, or from NSE_HOLIDAYS_FILE without it."""
+    if mcal is not None:
+        holidays = np.asarray(mcal.get_calendar("XNSE").holidays().holidays, dtype="datetime64[D]")
+    else:
+        holidays = pd.read_csv(NSE_HOLIDAYS_FILE, comment="#", usecols=["date"])["date"].to_numpy(dtype="datetime64[D]")
+    year = pd.Timestamp.now(tz="Asia/Kolkata").year
+    if not (holidays.astype("datetime64[Y]").astype(np.int64) + 1970 == year).any():
+        # Every holiday this year would be treated as a session: empty requests and false gaps
+        logger.warning(f"No NSE holidays listed for {year}; update {NSE_HOLIDAYS_FILE} or pandas_market_calendars")
+    return holidays
+
+@functools.lru_cache(maxsize=None)
+def _nse_calendar() -> np.busdaycalendar:
+    """NSE trading-day calendar, built on first use rather than at import."""
+    return np.busdaycalendar(holidays=_load_nse_holidays())
+
+VALID_SYMBOLS_FILE = Path("data/logs/valid_symbols.json")
+
+def _has_session(range_from: str, range_to: str) -> bool:
+    """True if the inclusive YYYY-MM-DD range contains at least one NSE trading day."""
+    return np.busday_count(range_from, np.datetime64(range_to) + 1, busdaycal=_nse_calendar()) > 0
+
+def _previous_session(now: pd.Timestamp) -> pd.Timestamp:
+    """Most recent NSE trading day strictly before now's date, at midnight Asia/Kolkata."""
+    day = np.busday_offset(np.datetime64(now.date()), -1, roll='forward', busdaycal=_nse_calendar())
+    return pd.Timestamp(str(day), tz="Asia/Kolkata")
+
+def _merge_ranges(ranges: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    """Merge overlapping or touching (start, end) ranges after sorting by start."""
+    merged: List[Tuple[str, str]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+def _to_ist(ts: pd.Series) -> pd.Series:
+    """Convert a timestamp column to Asia/Kolkata, skipping the parse when it is already tz-aware."""
+    if isinstance(ts.dtype, pd.DatetimeTZDtype):
+        return ts.dt.tz_convert("Asia/Kolkata")
+    unit = "s" if pd.api.types.is_numeric_dtype(ts) else None
+    return pd.to_datetime(ts, unit=unit, utc=True, errors='coerce', cache=True).dt.tz_convert("Asia/Kolkata")
+
+def _missing_runs_numpy(present: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Return [start, end) bin indices of each run of False in present."""
+    missing = np.flatnonzero(~present)
+    if missing.size == 0:
+        return missing, missing
+    breaks = np.flatnonzero(np.diff(missing) != 1) + 1
+    starts = missing[np.r_[0, breaks]]
+    ends = missing[np.r_[breaks - 1, missing.size - 1]] + 1
+    return starts, ends
+
+def _missing_runs_scan(present: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Single-pass run scan over present; only worth it once compiled by numba."""
+    n = present.shape[0]
+    starts = np.empty(n, dtype=np.int64)
+    ends = np.empty(n, dtype=np.int64)
+    runs = 0
+    i = 0
+    while i < n:
+        if present[i]:
+            i += 1
+            continue
+        starts[runs] = i
+        while i < n and not present[i]:
+            i += 1
+        ends[runs] = i
+        runs += 1
+    return starts[:runs], ends[:runs]
+
+_missing_runs = njit(cache=True)(_missing_runs_scan) if njit is not None else _missing_runs_numpy
+
 class Backfill:
     def __init__(self):
         self.config = load_config('config/config.yaml')
@@ -21,13 +114,19 @@ class Backfill:
         self.access_token = load_tokens()
         log_dir = Path("data/logs")
         log_dir.mkdir(parents=True, exist_ok=True)
+        pool_fyers_http(IO_POOL_WORKERS)  # keep-alive connections for the IO pool's REST calls
         self.fyers = fyersModel.FyersModel(
             client_id=self.client_id,
             token=self.access_token,
             log_path=str(log_dir)
         )
         self.storage = Storage()
-        self.symbols = pd.read_csv(SYMBOLS_FILE)['symbol'].tolist()
+        self.limiter = AsyncRateLimiter(API_RATE_LIMIT, 1)
+        self.io_pool = ThreadPoolExecutor(max_workers=IO_POOL_WORKERS, thread_name_prefix="fyers")
+        # interval_str -> symbol -> frame, collected while backfill_all runs and written once per file
+        self._pending: Optional[DefaultDict[str, Dict[str, pd.DataFrame]]] = None
+        # (symbol, resolution, range_from, range_to) -> history request, so 15s and 30s gap fills share one 1min fetch
+        self._responses: Dict[Tuple[str, str, str, str], asyncio.Future] = {}
         self.base_path = Path(r"C:\Users\mubas\OneDrive\Desktop\macd_pipeline")
         self.storage_path = self.base_path / 'data/ticks/historical'
         self.data_pipeline_path = self.base_path / 'data/ticks/data_pipeline'
@@ -36,56 +135,138 @@ class Backfill:
         logger.info(f"Ensured directories: {self.storage_path}, {self.data_pipeline_path}")
         # Clean up stray NSE files
         for path in [self.storage_path / "NSE", self.data_pipeline_path / "NSE"]:
-            if path.exists():
+            # Let rmtree's own stat decide the branch; the usual case is a single failed lookup
+            try:
+                shutil.rmtree(path)
+                logger.info(f"Removed stray NSE directory at {path}")
+            except FileNotFoundError:
+                pass
+            except NotADirectoryError:
                 try:
-                    if path.is_file():
-                        path.unlink()
-                        logger.info(f"Deleted stray NSE file at {path}")
-                    elif path.is_dir():
-                        import shutil
-                        shutil.rmtree(path)
-                        logger.info(f"Removed stray NSE directory at {path}")
+                    path.unlink()
+                    logger.info(f"Deleted stray NSE file at {path}")
                 except Exception as e:
                     logger.error(f"Failed to delete NSE entry: {e}")
-        self.blacklist = {'NSE:UNITEDSPIRITS-EQ', 'NSE:ZOMATO-EQ'}
-        valid_symbols = []
-        for symbol in self.symbols:
-            if symbol in self.blacklist:
-                logger.warning(f"Skipping {symbol}")
-                continue
-            try:
-                quote_response = self.fyers.quotes({"symbols": [symbol]})
-                if isinstance(quote_response, dict) and quote_response.get('s') == 'ok':
-                    valid_symbols.append(symbol)
-                else:
-                    logger.warning(f"Invalid symbol: {symbol}")
             except Exception as e:
-                logger.error(f"Error validating {symbol}: {e}")
-        self.symbols = valid_symbols
-        logger.info(f"Validated {len(self.symbols)} symbols")
+                logger.error(f"Failed to delete NSE entry: {e}")
+        self.blacklist = {'NSE:UNITEDSPIRITS-EQ', 'NSE:ZOMATO-EQ'}
+        symbols = pd.read_csv(SYMBOLS_FILE, usecols=['symbol'])['symbol']
+        blacklisted = symbols.isin(self.blacklist)
+        for symbol in symbols[blacklisted]:
+            logger.warning(f"Skipping {symbol}")
+        # Unvalidated until create() has checked them against the quotes API
+        self.symbols = symbols[~blacklisted].tolist()
+
+    @classmethod
+    async def create(cls) -> "Backfill":
+        """Build a Backfill and validate its symbols with concurrent batched quotes calls."""
+        backfill = cls()
+        await backfill._validate_symbols()
+        return backfill
+
+    async def _validate_batch(self, batch: List[str]) -> Tuple[List[str], List[str], List[str]]:
+        """Check a batch of symbols against the quotes endpoint.
 
-    def check_data_gaps(self, symbol: str, timeframe: str, expected_start: str, expected_end: str) -> List[Dict[str, str]]:
+        Returns (valid, invalid, failed): failed symbols could not be checked because of a
+        transient error and say nothing about whether the symbol exists.
+        """
         try:
-            df = self.storage.load_historical(symbol, timeframe)
+            async with self.limiter:
+                quote_response = await asyncio.get_running_loop().run_in_executor(
+                    self.io_pool, self.fyers.quotes, {"symbols": ",".join(batch)}
+                )
+            valid = self._valid_quotes(batch, quote_response)
+        except Exception as e:
+            logger.error(f"Error validating {batch[0]}..{batch[-1]}: {e}")
+            valid = None
+        if valid is None:
+            if len(batch) == 1:
+                return [], [], batch
+            # One bad symbol can fail the whole call; fall back to checking the batch symbol by symbol
+            results = await asyncio.gather(*(self._validate_batch([symbol]) for symbol in batch))
+            return tuple([symbol for result in results for symbol in result[i]] for i in range(3))
+        return valid, [symbol for symbol in batch if symbol not in valid], []
+
+    async def _validate_symbols(self):
+        cached = self._read_symbol_cache()
+        if cached is not None:
+            self.symbols = cached
+            logger.info(f"Using {len(self.symbols)} symbols validated within the last {SYMBOL_CACHE_TTL // 3600}h")
+            return
+        candidates = self.symbols
+        batches = [candidates[i:i + QUOTES_BATCH_SIZE] for i in range(0, len(candidates), QUOTES_BATCH_SIZE)]
+        results = await asyncio.gather(*(self._validate_batch(batch) for batch in batches))
+        invalid = {symbol for result in results for symbol in result[1]}
+        failed = [symbol for result in results for symbol in result[2]]
+        # Symbols that could not be checked stay in this run; only a confirmed-invalid symbol is dropped
+        self.symbols = [symbol for symbol in candidates if symbol not in invalid]
+        logger.info(f"Validated {len(self.symbols) - len(failed)} symbols, {len(invalid)} invalid, {len(failed)} unchecked")
+        if failed:
+            logger.warning(f"Not caching symbol validation: {len(failed)} symbols could not be checked")
+        elif self.symbols:
+            self._write_symbol_cache(candidates, self.symbols)
+
+    def _read_symbol_cache(self) -> Optional[List[str]]:
+        try:
+            with open(VALID_SYMBOLS_FILE) as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # A cache of the wrong shape (hand-edited, truncated, older format) is treated as a miss
+        if not (isinstance(cache, dict)
+                and isinstance(cache.get("validated_at"), (int, float))
+                and isinstance(cache.get("symbols"), list)
+                and all(isinstance(symbol, str) for symbol in cache["symbols"])):
+            logger.warning(f"Ignoring malformed symbol cache {VALID_SYMBOLS_FILE}")
+            return None
+        if time.time() - cache["validated_at"] > SYMBOL_CACHE_TTL or cache.get("candidates") != self.symbols:
+            return None
+        return cache["symbols"]
+
+    def _write_symbol_cache(self, candidates: List[str], valid: List[str]):
+        try:
+            VALID_SYMBOLS_FILE.parent.mkdir(parents=True, exist_ok=True)
+            with open(VALID_SYMBOLS_FILE, 'w') as f:
+                json.dump({"validated_at": time.time(), "candidates": candidates, "symbols": valid}, f)
+        except OSError as e:
+            logger.warning(f"Failed to write symbol cache {VALID_SYMBOLS_FILE}: {e}")
+
+    def _valid_quotes(self, batch: List[str], quote_response: Any) -> Optional[List[str]]:
+        if not (isinstance(quote_response, dict) and quote_response.get('s') == 'ok'):
+            logger.warning(f"Quote validation failed for {batch[0]}..{batch[-1]}: {quote_response}")
+            return None
+        ok = {quote.get('n') for quote in quote_response.get('d', []) if quote.get('s') == 'ok'}
+        for symbol in batch:
+            if symbol not in ok:
+                logger.warning(f"Invalid symbol: {symbol}")
+        return [symbol for symbol in batch if symbol in ok]
+
+    def check_data_gaps(self, symbol: str, timeframe: str, expected_start: str, expected_end: str, df: Optional[pd.DataFrame] = None) -> List[Dict[str, str]]:
+        try:
+            start_ts = pd.Timestamp(expected_start, tz="Asia/Kolkata")
+            end_ts = pd.Timestamp(expected_end, tz="Asia/Kolkata")
+            if df is None:
+                df = self.storage.load_timestamps(symbol, timeframe, start_ts, end_ts)
             if df.empty:
                 logger.warning(f"No data for {symbol} ({timeframe}). Full gap detected")
                 return [{"start": expected_start, "end": expected_end}]
-            df["timestamp"] = pd.to_datetime(df['timestamp'], utc=True, errors='coerce').dt.tz_convert("Asia/Kolkata")
-            if df['timestamp'].isna().any():
+            ts = _to_ist(df['timestamp'])
+            if ts.isna().any():
                 logger.warning(f"Invalid timestamps in {symbol} ({timeframe})")
                 return [{"start": expected_start, "end": expected_end}]
-            start_ts = pd.Timestamp(expected_start, tz="Asia/Kolkata")
-            end_ts = pd.Timestamp(expected_end, tz="Asia/Kolkata")
-            gaps = []
-            current_time = start_ts
-            while current_time < end_ts:
-                next_time = current_time + pd.Timedelta(timeframe)
-                if not ((df['timestamp'] >= current_time) & (df['timestamp'] < next_time)).any():
-                    gaps.append({
-                        "start": current_time.strftime("%Y-%m-%d %H:%M:%S%z"),
-                        "end": next_time.strftime("%Y-%m-%d %H:%M:%S%z")
-                    })
-                current_time = next_time
+            step_ns = pd.Timedelta(timeframe).value
+            n_bins = -(-(end_ts.value - start_ts.value) // step_ns)
+            if n_bins <= 0:
+                return []
+            # Mark every expected window that holds at least one bar, then collapse the empty ones into runs
+            offsets = pd.DatetimeIndex(ts).as_unit("ns").asi8 - start_ts.value
+            bins = offsets[offsets >= 0] // step_ns
+            present = np.zeros(n_bins, dtype=bool)
+            present[bins[bins < n_bins]] = True
+            run_starts, run_ends = _missing_runs(present)
+            starts = (start_ts + pd.to_timedelta(run_starts * step_ns)).strftime("%Y-%m-%d %H:%M:%S%z")
+            ends = (start_ts + pd.to_timedelta(run_ends * step_ns)).strftime("%Y-%m-%d %H:%M:%S%z")
+            gaps = [{"start": start, "end": end} for start, end in zip(starts, ends)]
             if gaps:
                 logger.warning(f"Found {len(gaps)} gaps for {symbol} ({timeframe}): {gaps[:2]}")
             return gaps
@@ -93,7 +274,44 @@ class Backfill:
             logger.error(f"Error checking gaps for {symbol} ({timeframe}): {e}")
             return [{"start": expected_start, "end": expected_end}]
 
-    async def fetch_historical_data(self, symbol: str, interval: int, lookback: int, today_only: bool = False) -> List[Dict[str, Any]]:
+    async def _request_history(self, data: Dict[str, Any], max_attempts: int = 3) -> Any:
+        """Run one Fyers history request on the IO pool, paced by the shared limiter.
+
+        Error responses (rate limits included) are retried with jittered exponential backoff.
+        """
+        for attempt in range(1, max_attempts + 1):
+            async with self.limiter:
+                response = await asyncio.get_running_loop().run_in_executor(
+                    self.io_pool, self.fyers.history, data
+                )
+            if not (isinstance(response, dict) and response.get('s') == 'error') or attempt == max_attempts:
+                return response
+            delay = backoff(attempt, cap=60)
+            logger.warning(f"History request for {data['symbol']} failed ({response.get('code')}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    async def _history(self, data: Dict[str, Any]) -> Any:
+        """Fetch history once per (symbol, resolution, range); concurrent callers share the in-flight request."""
+        key = (data["symbol"], data["resolution"], data["range_from"], data["range_to"])
+        task = self._responses.get(key)
+        if task is None:
+            task = self._responses[key] = asyncio.ensure_future(self._request_history(data))
+        try:
+            response = await asyncio.shield(task)
+        except Exception:
+            if self._responses.get(key) is task:
+                del self._responses[key]
+            raise
+        # Only successful responses are reused; failures are retried on the next call
+        if not (isinstance(response, dict) and response.get('s') == 'ok') and self._responses.get(key) is task:
+            del self._responses[key]
+        return response
+
+    def _forget_responses(self, symbol: str):
+        for key in [key for key in self._responses if key[0] == symbol]:
+            del self._responses[key]
+
+    async def fetch_historical_data(self, symbol: str, interval: int, lookback: int, today_only: bool = False) -> pd.DataFrame:
         try:
             lookback = min(lookback, 100)  # Cap at 100 days per Fyers API limit
             if today_only:
@@ -101,65 +319,73 @@ class Backfill:
                 from_date = to_date = now.strftime('%Y-%m-%d')
                 periods = [(from_date, to_date)]
             else:
-                to_date = pd.Timestamp.now(tz="Asia/Kolkata") - pd.Timedelta(days=1)  # Up to yesterday
+                to_date = (pd.Timestamp.now(tz="Asia/Kolkata") - pd.Timedelta(days=1)).normalize()  # Up to yesterday
                 from_date = to_date - pd.Timedelta(days=lookback)
-                periods = []
-                current_start = from_date
-                while current_start <= to_date:
-                    current_end = min(current_start + pd.Timedelta(days=60), to_date)
-                    periods.append((current_start.strftime('%Y-%m-%d'), current_end.strftime('%Y-%m-%d')))
-                    current_start = current_end + pd.Timedelta(seconds=1)
+                # 60-day windows; the last anchor stays strictly before to_date so no zero-length tail is requested
+                anchors = pd.date_range(from_date, max(from_date, to_date - pd.Timedelta(days=1)), freq="60D")
+                ends = anchors + pd.Timedelta(days=60)
+                ends = ends.where(ends < to_date, to_date)
+                periods = list(zip(anchors.strftime('%Y-%m-%d'), ends.strftime('%Y-%m-%d')))
+            periods = [(start, end) for start, end in periods if _has_session(start, end)]
+            if not periods:
+                logger.info(f"No trading sessions for {symbol} ({interval}) in the requested range")
+                return pd.DataFrame(columns=CANDLE_COLUMNS)
+            # Constant part of the payload is built once; each request gets its own copy because
+            # requests run concurrently and _history keys its memo on the payload's fields
+            base = {"symbol": symbol, "resolution": str(interval), "date_format": "1", "cont_flag": True}
+            responses = await asyncio.gather(*(
+                self._history({**base, "range_from": start, "range_to": end})
+                for start, end in periods
+            ))
             all_candles = []
-            for start, end in periods:
-                data = {
-                    "symbol": symbol,
-                    "resolution": str(interval),
-                    "date_format": "1",
-                    "range_from": start,
-                    "range_to": end,
-                    "cont_flag": True
-                }
-                response = await asyncio.get_event_loop().run_in_executor(
-                    None, lambda: self.fyers.history(data)
-                )
+            for (start, end), response in zip(periods, responses):
                 if isinstance(response, dict) and response.get('s') == 'ok':
                     candles = response.get('candles', [])
-                    logger.debug(f"Raw candles for {symbol} ({interval}) from {start} to {end}: {candles[:2]}")
-                    logger.info(f"Fetched {len(candles)} candles for {symbol} ({interval}) from {start} to {end}")
+                    logger.debug("Raw candles for %s (%s) from %s to %s: %s", symbol, interval, start, end, candles[:2])
+                    logger.info("Fetched %d candles for %s (%s) from %s to %s", len(candles), symbol, interval, start, end)
                     all_candles.extend(candles)
                 else:
                     logger.warning(f"No data for {symbol} ({interval}) from {start} to {end}: {response}")
-                await asyncio.sleep(2)
-            if all_candles:
-                df = pd.DataFrame(all_candles, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-                duplicates = df['timestamp'].duplicated().sum()
-                if duplicates:
-                    logger.warning(f"Removed {duplicates} duplicate timestamps for {symbol} ({interval})")
-                    df = df.drop_duplicates(subset=['timestamp'], keep='last').sort_values('timestamp')
-                return cast(List[Dict[str, Any]], df.to_dict('records'))
-            return []
+            if not all_candles:
+                return pd.DataFrame(columns=CANDLE_COLUMNS)
+            arr = np.asarray(all_candles, dtype=np.float64)
+            arr = arr[np.argsort(arr[:, 0], kind="mergesort")]
+            # Stable sort keeps arrival order within a timestamp, so the last row of each run wins
+            keep = np.append(arr[1:, 0] != arr[:-1, 0], True)
+            if not keep.all():
+                logger.warning(f"Removed {int((~keep).sum())} duplicate timestamps for {symbol} ({interval})")
+                arr = arr[keep]
+            df = pd.DataFrame(arr, columns=CANDLE_COLUMNS)
+            df['timestamp'] = df['timestamp'].astype(np.int64)
+            df['volume'] = df['volume'].astype(np.int64)
+            return df
         except Exception as e:
             logger.error(f"Error fetching data for {symbol}: {e}")
-            return []
+            return pd.DataFrame(columns=CANDLE_COLUMNS)
+
+    @staticmethod
+    def _interval_str(interval: int) -> str:
+        return f"{interval}min" if interval >= 1 else f"{int(interval*60)}s"
 
-    def save_to_h5(self, symbol: str, interval: int, candles: Sequence[Dict[str, Any]]):
-        if not candles:
+    def _frame_candles(self, symbol: str, interval: int, df: Optional[pd.DataFrame]) -> Optional[pd.DataFrame]:
+        """Convert epoch-second candles to an Asia/Kolkata frame ready for Storage, or None if unusable."""
+        if df is None or df.empty:
             logger.warning(f"No data to save for {symbol} ({interval})")
-            return
-        df = pd.DataFrame(candles, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+            return None
         if df['timestamp'].max() > 1e12:  # Nanoseconds
             logger.error(f"Invalid timestamp units for {symbol} ({interval}): {df['timestamp'].head()}")
+            return None
+        return df.assign(timestamp=epoch_to_ist(df['timestamp']))
+
+    def save_to_h5(self, symbol: str, interval: int, df: Optional[pd.DataFrame]):
+        df = self._frame_candles(symbol, interval, df)
+        if df is None:
             return
-        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='s', utc=True).dt.tz_convert('Asia/Kolkata')
-        interval_str = f"{interval}min" if interval >= 1 else f"{int(interval*60)}s"
+        interval_str = self._interval_str(interval)
         try:
-            logger.debug(f"Saving {symbol} ({interval_str}): {len(df)} rows")
+            logger.debug("Saving %s (%s): %d rows", symbol, interval_str, len(df))
             self.storage.save_historical(symbol, df, interval_str)
-            file_path = self.storage_path / f"{interval_str}.h5"
-            if os.path.exists(file_path):
-                logger.info(f"Verified {file_path}: Size {os.path.getsize(file_path)} bytes")
-            else:
-                logger.error(f"File not found after save: {file_path}")
+            logger.debug("Saved %s to %s", symbol, self.storage_path / f"{interval_str}.h5")
         except Exception as e:
             logger.error(f"Error saving {symbol} ({interval_str}): {e}")
 
@@ -167,8 +393,16 @@ class Backfill:
         for attempt in range(1, max_attempts + 1):
             try:
                 candles = await self.fetch_historical_data(symbol, interval, lookback_days, today_only)
-                if candles:
-                    self.save_to_h5(symbol, interval, candles)
+                if not candles.empty:
+                    if self._pending is not None:
+                        # Inside backfill_all: defer the write so each interval file is opened once
+                        frame = self._frame_candles(symbol, interval, candles)
+                        if frame is not None:
+                            self._pending[self._interval_str(interval)][symbol] = frame
+                    else:
+                        await asyncio.get_running_loop().run_in_executor(
+                            self.io_pool, self.save_to_h5, symbol, interval, candles
+                        )
                     return
                 logger.warning(f"No data to backfill for {symbol} ({interval})")
                 return
@@ -177,84 +411,79 @@ class Backfill:
                 if attempt == max_attempts:
                     logger.error(f"Failed to backfill {symbol} after {max_attempts} attempts")
                     return
-                await asyncio.sleep(2 ** attempt)
+                await asyncio.sleep(backoff(attempt))
 
     async def backfill_gaps(self, symbol: str, timeframe: str, gaps: List[Dict[str, str]]):
         try:
             if timeframe in ["15s", "30s"]:
-                for gap in gaps:
-                    start_ts = pd.Timestamp(gap["start"], tz="Asia/Kolkata")
-                    end_ts = pd.Timestamp(gap["end"], tz="Asia/Kolkata")
-                    fetch_start = (start_ts - pd.Timedelta(minutes=5)).strftime("%Y-%m-%d")
-                    fetch_end = (end_ts + pd.Timedelta(minutes=5)).strftime("%Y-%m-%d")
-                    data = {
-                        "symbol": symbol,
-                        "resolution": "1",
-                        "date_format": "1",
-                        "range_from": fetch_start,
-                        "range_to": fetch_end,
-                        "cont_flag": True
-                    }
-                    response = await asyncio.get_event_loop().run_in_executor(
-                        None, lambda: self.fyers.history(data)
-                    )
+                bounds = [(pd.Timestamp(gap["start"], tz="Asia/Kolkata"), pd.Timestamp(gap["end"], tz="Asia/Kolkata")) for gap in gaps]
+                # Gaps on the same trading days share one padded 1min fetch
+                ranges = _merge_ranges([
+                    ((start_ts - pd.Timedelta(minutes=5)).strftime("%Y-%m-%d"), (end_ts + pd.Timedelta(minutes=5)).strftime("%Y-%m-%d"))
+                    for start_ts, end_ts in bounds
+                ])
+                ranges = [(range_from, range_to) for range_from, range_to in ranges if _has_session(range_from, range_to)]
+                base = {"symbol": symbol, "resolution": "1", "date_format": "1", "cont_flag": True}
+                responses = await asyncio.gather(*(
+                    self._history({**base, "range_from": range_from, "range_to": range_to})
+                    for range_from, range_to in ranges
+                ))
+                frames = []
+                for (range_from, range_to), response in zip(ranges, responses):
                     if isinstance(response, dict) and response.get('s') == 'ok':
                         candles = response.get('candles', [])
                         if candles:
-                            df = pd.DataFrame(candles, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-                            df["timestamp"] = pd.to_datetime(df['timestamp'], unit="s", utc=True).dt.tz_convert("Asia/Kolkata")
-                            duplicates = df['timestamp'].duplicated().sum()
-                            if duplicates:
-                                logger.warning(f"Found {duplicates} duplicates for {symbol} ({timeframe})")
-                                df = df.drop_duplicates(subset=['timestamp'], keep='last')
-                            expected_ts = pd.date_range(start=start_ts, end=end_ts, freq=timeframe, tz="Asia/Kolkata")
-                            df = df.set_index("timestamp").reindex(expected_ts, method='ffill').reset_index()
-                            df = df.rename(columns={'index': 'timestamp'})
-                            df = df.groupby('timestamp').agg({
-                                "open": "first",
-                                "high": "max",
-                                "low": "min",
-                                "close": "last",
-                                "volume": "sum"
-                            }).reset_index()
-                            duplicates = df['timestamp'].duplicated().sum()
-                            if duplicates:
-                                logger.warning(f"Found {duplicates} duplicates after resampling {symbol} ({timeframe})")
-                                df = df.drop_duplicates(subset=['timestamp'], keep='last')
-                            self.storage.save_historical(symbol, df, timeframe)
-                            logger.info(f"Backfilled {symbol} ({timeframe}) for gap {gap['start']} to {gap['end']}")
+                            frames.append(pd.DataFrame(candles, columns=CANDLE_COLUMNS))
                         else:
-                            logger.warning(f"No 1min data for {symbol} ({timeframe})")
+                            logger.warning(f"No 1min data for {symbol} ({timeframe}) from {range_from} to {range_to}")
                     else:
                         logger.error(f"Failed to fetch 1min data for {symbol}: {response}")
+                if frames:
+                    minute_df = pd.concat(frames, ignore_index=True)
+                    minute_df["timestamp"] = epoch_to_ist(minute_df['timestamp'])
+                    rows = len(minute_df)
+                    minute_df = minute_df.drop_duplicates(subset=['timestamp'], keep='last')
+                    if len(minute_df) < rows:
+                        logger.warning(f"Found {rows - len(minute_df)} duplicates for {symbol} ({timeframe})")
+                    expected_ts = pd.DatetimeIndex([], tz="Asia/Kolkata")
+                    for start_ts, end_ts in bounds:
+                        expected_ts = expected_ts.union(pd.date_range(start=start_ts, end=end_ts, freq=timeframe, tz="Asia/Kolkata"))
+                    # Each 15s/30s slot takes the latest 1min bar at or before it: an asfreq-style ffill
+                    # evaluated only at the gap timestamps, with no binning or aggregation pass
+                    df = minute_df.set_index('timestamp').sort_index().reindex(expected_ts, method='ffill')
+                    df = df.rename_axis('timestamp').reset_index()
+                    await asyncio.get_running_loop().run_in_executor(
+                        self.io_pool, self.storage.save_historical, symbol, df, timeframe
+                    )
+                    logger.info("Backfilled %s (%s) for %d gaps from %s to %s", symbol, timeframe, len(gaps), gaps[0]['start'], gaps[-1]['end'])
             else:
                 interval = int(pd.Timedelta(timeframe).total_seconds() / 60)
-                for gap in gaps:
-                    start = pd.Timestamp(gap["start"]).strftime("%Y-%m-%d")
-                    end = pd.Timestamp(gap["end"]).strftime("%Y-%m-%d")
-                    data = {
-                        "symbol": symbol,
-                        "resolution": str(interval),
-                        "date_format": "1",
-                        "range_from": start,
-                        "range_to": end,
-                        "cont_flag": True
-                    }
-                    response = await asyncio.get_event_loop().run_in_executor(
-                        None, lambda: self.fyers.history(data)
-                    )
+                base = {"symbol": symbol, "resolution": str(interval), "date_format": "1", "cont_flag": True}
+                responses = await asyncio.gather(*(
+                    self._history({
+                        **base,
+                        "range_from": pd.Timestamp(gap["start"]).strftime("%Y-%m-%d"),
+                        "range_to": pd.Timestamp(gap["end"]).strftime("%Y-%m-%d"),
+                    })
+                    for gap in gaps
+                ))
+                for gap, response in zip(gaps, responses):
                     if isinstance(response, dict) and response.get('s') == 'ok':
                         candles = response.get('candles', [])
                         if candles:
-                            df = pd.DataFrame(candles, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+                            df = pd.DataFrame(candles, columns=CANDLE_COLUMNS)
                             df = df.drop_duplicates(subset=['timestamp'], keep='last')
-                            self.save_to_h5(symbol, interval, cast(Sequence[Dict[str, Any]], df.to_dict('records')))
-                            logger.info(f"Backfilled {symbol} ({timeframe}) for gap {gap['start']} to {gap['end']}")
+                            await asyncio.get_running_loop().run_in_executor(
+                                self.io_pool, self.save_to_h5, symbol, interval, df
+                            )
+                            logger.info("Backfilled %s (%s) for gap %s to %s", symbol, timeframe, gap['start'], gap['end'])
                         else:
                             logger.warning(f"No data for {symbol} ({timeframe})")
                     else:
                         logger.error(f"Failed to backfill {symbol} ({timeframe}): {response}")
-            remaining_gaps = self.check_data_gaps(symbol, timeframe, gaps[0]["start"], gaps[-1]["end"])
+            remaining_gaps = await asyncio.get_running_loop().run_in_executor(
+                self.io_pool, self.check_data_gaps, symbol, timeframe, gaps[0]["start"], gaps[-1]["end"]
+            )
             if not remaining_gaps:
                 logger.info(f"No gaps remain for {symbol} ({timeframe}) after backfill")
             else:
@@ -262,58 +491,82 @@ class Backfill:
         except Exception as e:
             logger.error(f"Error backfilling gaps for {symbol} ({timeframe}): {e}")
 
-    async def backfill_all(self, interval: int = 1, lookback_days: int = 1, today_only: bool = False):
-        api_calls = 0
-        start_time = time.time()
-        yesterday = pd.Timestamp.now(tz="Asia/Kolkata") - pd.Timedelta(days=1)
-        market_open = yesterday.replace(hour=9, minute=15, second=0, microsecond=0)
-        market_close = yesterday.replace(hour=15, minute=30, second=0, microsecond=0)
-        test_symbols = self.symbols  # Use all validated symbols
-        for symbol in test_symbols:
-            await self.validate_token()
+    async def _backfill_one(self, symbol: str, market_open: str, market_close: str, lookback_days: int, today_only: bool):
+        try:
             for tf in ["15s", "30s", "1min", "3min", "5min"]:
-                gaps = self.check_data_gaps(
-                    symbol, tf,
-                    market_open.strftime("%Y-%m-%d %H:%M:%S%z"),
-                    market_close.strftime("%Y-%m-%d %H:%M:%S%z")
+                # The read waits on Storage's HDF5 lock while pool threads write, so keep it off the loop
+                gaps = await asyncio.get_running_loop().run_in_executor(
+                    self.io_pool, self.check_data_gaps, symbol, tf, market_open, market_close
                 )
                 if gaps:
                     await self.backfill_gaps(symbol, tf, gaps)
             if not today_only:
                 for interval in [1, 3, 5]:
                     await self.backfill_symbol(symbol, interval, lookback_days, today_only=False)
-            api_calls += 3
-            if api_calls >= 30:
-                elapsed = time.time() - start_time
-                logger.info(f"Processed {api_calls} API calls in {elapsed:.2f}s")
-                if elapsed < 60:
-                    logger.warning("Approaching rate limit. Sleeping for 60s")
-                    await asyncio.sleep(60)
-                api_calls = 0
-                start_time = time.time()
-            await asyncio.sleep(5)
+        finally:
+            # Responses are only shared within one symbol's pass; drop them to bound memory
+            self._forget_responses(symbol)
+
+    async def _guarded_backfill(self, semaphore: asyncio.Semaphore, symbol: str, *args):
+        async with semaphore:
+            try:
+                await self._backfill_one(symbol, *args)
+            except Exception as e:
+                logger.error(f"Backfill failed for {symbol}: {e}")
+
+    async def backfill_all(self, interval: int = 1, lookback_days: int = 1, today_only: bool = False):
+        start_time = time.time()
+        yesterday = _previous_session(pd.Timestamp.now(tz="Asia/Kolkata"))
+        market_open = yesterday.replace(hour=9, minute=15, second=0, microsecond=0)
+        market_close = yesterday.replace(hour=15, minute=30, second=0, microsecond=0)
+        await self.validate_token()
+        # Requests from all symbols share self.limiter, so the fan-out stays under the API rate limit
+        semaphore = asyncio.Semaphore(BACKFILL_CONCURRENCY)
+        self._pending = defaultdict(dict)
+        try:
+            await asyncio.gather(*[
+                self._guarded_backfill(
+                    semaphore, symbol,
+                    market_open.strftime("%Y-%m-%d %H:%M:%S%z"),
+                    market_close.strftime("%Y-%m-%d %H:%M:%S%z"),
+                    lookback_days, today_only
+                )
+                for symbol in self.symbols
+            ])
+        finally:
+            pending, self._pending = self._pending, None
+            await self._flush_pending(pending)
+        logger.info(f"Backfilled {len(self.symbols)} symbols in {time.time() - start_time:.2f}s")
+
+    async def _flush_pending(self, pending: Dict[str, Dict[str, pd.DataFrame]]):
+        for interval_str, frames in pending.items():
+            try:
+                await asyncio.get_running_loop().run_in_executor(
+                    self.io_pool, self.storage.save_historical_batch, interval_str, frames
+                )
+                logger.info(f"Saved {len(frames)} symbols to {interval_str}.h5")
+            except Exception as e:
+                logger.error(f"Error saving {interval_str} batch: {e}")
 
     async def validate_token(self, max_attempts: int = 3):
         for attempt in range(1, max_attempts + 1):
             try:
-                quote_response = await asyncio.get_event_loop().run_in_executor(
-                    None, lambda: self.fyers.quotes({"symbols": ["NSE:RELIANCE-EQ"]})
-                )
+                async with self.limiter:
+                    quote_response = await asyncio.get_running_loop().run_in_executor(
+                        self.io_pool, self.fyers.quotes, {"symbols": ["NSE:RELIANCE-EQ"]}
+                    )
                 if isinstance(quote_response, dict) and quote_response.get('s') == 'ok':
                     logger.info("Fetching quotes successful")
                     return
                 logger.error(f"Token validation failed: {quote_response}")
                 self.access_token = load_tokens()
-                log_dir = Path("data/logs")
-                log_dir.mkdir(parents=True, exist_ok=True)
-                self.fyers = fyersModel.FyersModel(
-                    client_id=self.client_id,
-                    token=self.access_token,
-                    log_path=str(log_dir)
-                )
-                quote_response = await asyncio.get_event_loop().run_in_executor(
-                    None, lambda: self.fyers.quotes({"symbols": ["NSE:RELIANCE-EQ"]})
-                )
+                # Swap the token on the existing client; requests are signed with the cached header
+                self.fyers.token = self.access_token
+                self.fyers.header = f"{self.client_id}:{self.access_token}"
+                async with self.limiter:
+                    quote_response = await asyncio.get_running_loop().run_in_executor(
+                        self.io_pool, self.fyers.quotes, {"symbols": ["NSE:RELIANCE-EQ"]}
+                    )
                 if isinstance(quote_response, dict) and quote_response.get('s') == 'ok':
                     logger.info("Token refreshed successfully")
                     return
@@ -323,8 +576,20 @@ class Backfill:
                 logger.error(f"Error validating token (attempt {attempt}): {e}")
                 if attempt == max_attempts:
                     raise RuntimeError(f"Token validation failed after {max_attempts} attempts: {e}")
-                await asyncio.sleep(2 ** attempt)
+                await asyncio.sleep(backoff(attempt))
+
+    def close(self):
+        self.io_pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+async def main():
+    with await Backfill.create() as backfill:
+        await backfill.backfill_all(lookback_days=7)
 
 if __name__ == "__main__":
-    backfill = Backfill()
-    asyncio.run(backfill.backfill_all(lookback_days=7))
\ No newline at end of file
+    asyncio.run(main())
\ No newline at end of file
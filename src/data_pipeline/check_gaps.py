@@ -4,10 +4,26 @@ from datetime import datetime
 import pytz
 from src.data_pipeline.backfill import Backfill
 from src.utils.logger import get_logger
-from config.config import SYMBOLS_FILE
+from config.config import BACKFILL_CONCURRENCY
 
 logger = get_logger(__name__)
 
+async def _check_symbol(backfill: Backfill, semaphore: asyncio.Semaphore, symbol: str, market_open: str, market_close: str):
+    async with semaphore:
+        try:
+            loop = asyncio.get_running_loop()
+            for tf in ["15s", "30s", "1min", "3min", "5min"]:
+                # HDF5 reads go to the IO pool so other symbols' checks and backfills keep running;
+                # Storage serializes them with the pool's writes on its shared lock
+                gaps = await loop.run_in_executor(
+                    backfill.io_pool, backfill.check_data_gaps, symbol, tf, market_open, market_close
+                )
+                if gaps:
+                    logger.info(f"Found {len(gaps)} gaps for {symbol} ({tf}). Backfilling.")
+                    await backfill.backfill_gaps(symbol, tf, gaps)
+        except Exception as e:
+            logger.error(f"Gap check failed for {symbol}: {e}")
+
 async def check_todays_gaps():
     now = datetime.now(tz=pytz.timezone("Asia/Kolkata"))
     market_close = now.replace(hour=15, minute=30, second=0, microsecond=0)
@@ -16,20 +32,22 @@ async def check_todays_gaps():
         check_date = now - pd.Timedelta(days=1)
     else:
         check_date = now
-    backfill = Backfill()
-    symbols = pd.read_csv(SYMBOLS_FILE)["symbol"].tolist()
+    backfill = await Backfill.create()
     market_open = check_date.replace(hour=9, minute=15, second=0)
     market_close = check_date.replace(hour=15, minute=30, second=0)
-    for symbol in symbols:
-        for tf in ["15s", "30s", "1min", "3min", "5min"]:
-            gaps = backfill.check_data_gaps(
-                symbol, tf,
+    # REST calls from all symbols still share backfill.limiter, so the fan-out stays under the API rate limit
+    semaphore = asyncio.Semaphore(BACKFILL_CONCURRENCY)
+    try:
+        await asyncio.gather(*[
+            _check_symbol(
+                backfill, semaphore, symbol,
                 market_open.strftime("%Y-%m-%d %H:%M:%S%z"),
                 market_close.strftime("%Y-%m-%d %H:%M:%S%z")
             )
-            if gaps:
-                logger.info(f"Found {len(gaps)} gaps for {symbol} ({tf}). Backfilling.")
-                await backfill.backfill_gaps(symbol, tf, gaps)
+            for symbol in backfill.symbols
+        ])
+    finally:
+        backfill.close()
 
 if __name__ == "__main__":
     asyncio.run(check_todays_gaps())
\ No newline at end of file
@@ -1,33 +1,46 @@
 from fyers_apiv3.FyersWebsocket import data_ws
+import asyncio
+import numpy as np
 import pandas as pd
-import queue
 import time
 from typing import Dict, Any, List, cast
 from pathlib import Path
+try:
+    import uvloop
+except ImportError:  # uvloop is optional; the default asyncio loop works the same, just slower
+    uvloop = None
 from src.utils.config_loader import load_config
 from src.utils.fyers_auth_ngrok import load_tokens
 from src.utils.logger import get_logger
+from src.utils.rate_limiter import AsyncRateLimiter
+from src.utils.retry import backoff
+from src.utils.http_pool import pool_fyers_http
 from fyers_apiv3 import fyersModel
-from config.config import SYMBOLS_FILE
+from src.data_pipeline.tick_ring import TickRing
+from config.config import SYMBOLS_FILE, API_RATE_LIMIT, QUOTES_BATCH_SIZE, IO_POOL_WORKERS
 
 logger = get_logger(__name__)
 
+TICK_TIMEOUT = 120  # seconds without ticks before falling back to REST quotes
+RESUBSCRIBE_INTERVAL = 300  # seconds between periodic resubscribes, for subscriptions lost on a live socket
+
 class FyersWebSocketClient:
     def __init__(self, config_path: str = "config/config.yaml"):
         """Initialize WebSocket client with Fyers API credentials and symbol list."""
         self.config = load_config(config_path)
         self.client_id = self.config["fyers"]["client_id"]
         self.access_token = load_tokens()
-        self.symbols = pd.read_csv(SYMBOLS_FILE)["symbol"].tolist()
         self.blacklist = {'NSE:UNITEDSPIRITS-EQ', 'NSE:ZOMATO-EQ'}
-        self.symbols = [s for s in self.symbols if s not in self.blacklist]
+        symbols = pd.read_csv(SYMBOLS_FILE, usecols=["symbol"])["symbol"]
+        self.symbols = symbols[~symbols.isin(self.blacklist)].tolist()
         logger.info(f"Subscribing to {len(self.symbols)} symbols")
-        self.tick_queues = {symbol: queue.Queue() for symbol in self.symbols}
+        self.ticks = TickRing(self.symbols)
         self.last_tick_time = time.time()
-        self.subscribed_symbols = set()  # Track symbols with received ticks
-        self.last_volume = {symbol: 0 for symbol in self.symbols}  # Track last known volume
+        self.last_volume = np.zeros(len(self.symbols), dtype=np.int64)  # last known volume, indexed by TickRing sym id
+        self.limiter = AsyncRateLimiter(API_RATE_LIMIT)
         log_dir = Path("data/logs")
         log_dir.mkdir(parents=True, exist_ok=True)
+        pool_fyers_http(IO_POOL_WORKERS)  # validation and fallback quotes reuse TLS connections
         self.fyers = fyersModel.FyersModel(
             client_id=self.client_id,
             token=self.access_token,
@@ -56,22 +69,37 @@ class FyersWebSocketClient:
             else:
                 logger.error(f"Invalid token or API issue for {test_symbol}: {quote_response}")
                 raise RuntimeError("Token validation failed")
-            # Validate remaining symbols
-            for symbol in self.symbols[1:]:
-                response = self.fyers.quotes({"symbols": symbol})
+            # Validate remaining symbols, QUOTES_BATCH_SIZE per request
+            remaining = self.symbols[1:]
+            for i in range(0, len(remaining), QUOTES_BATCH_SIZE):
+                batch = remaining[i:i + QUOTES_BATCH_SIZE]
+                response = self.fyers.quotes({"symbols": ",".join(batch)})
                 if isinstance(response, dict) and response.get("s") == "ok":
-                    valid_symbols.append(symbol)
+                    ok = {quote.get("n") for quote in response.get("d", []) if quote.get("s") == "ok"}
                 else:
-                    logger.warning(f"Invalid symbol {symbol}: {response}")
+                    # One bad symbol can fail the whole batch; check its members one by one
+                    logger.warning(f"Quote validation failed for {batch[0]}..{batch[-1]}: {response}")
+                    ok = set()
+                    for symbol in batch:
+                        single = self.fyers.quotes({"symbols": symbol})
+                        if isinstance(single, dict) and single.get("s") == "ok":
+                            ok.add(symbol)
+                for symbol in batch:
+                    if symbol in ok:
+                        valid_symbols.append(symbol)
+                    else:
+                        logger.warning(f"Invalid symbol {symbol}")
             self.symbols = valid_symbols
             logger.info(f"Validated {len(self.symbols)} symbols")
+            # Symbols that have not ticked yet; _on_message discards from it, so checks never rebuild the set
+            self.missing_symbols = set(self.symbols)
         except Exception as e:
             logger.error(f"Token validation failed: {e}")
             raise
 
     def _on_message(self, message: Dict[str, Any]) -> None:
         """Handle incoming WebSocket messages."""
-        logger.debug(f"Raw WebSocket message: {message}")
+        logger.debug("Raw WebSocket message: %s", message)
         try:
             if not isinstance(message, dict):
                 logger.error(f"Unexpected message type: {type(message)}")
@@ -89,18 +117,23 @@ class FyersWebSocketClient:
             # Process tick messages
             symbol = message_dict.get("symbol")
             ltp = message_dict.get("ltp")
-            vol = message_dict.get("vol_traded_today", self.last_volume.get(symbol, 0))
+            # Resolve the symbol to its integer id once; everything after indexes arrays
+            sid = self.ticks.sym_id.get(symbol)
+            if sid is None:
+                logger.debug("Non-tick or unknown symbol message: %s", symbol)
+                return
+            vol = message_dict.get("vol_traded_today")
+            if vol is None:
+                vol = self.last_volume[sid]
             last_qty = message_dict.get("last_traded_qty", 0)
-            timestamp = pd.Timestamp.now(tz="Asia/Kolkata")
-            if symbol in self.tick_queues and ltp is not None:
-                tick = {"timestamp": timestamp, "ltp": ltp, "volume": vol, "last_qty": last_qty}
-                self.tick_queues[symbol].put(tick)
+            timestamp = time.time_ns()  # epoch ns; the resampler converts to Asia/Kolkata per batch
+            if ltp is not None and self.ticks.put_id(sid, timestamp, ltp, vol, last_qty or 0):
                 self.last_tick_time = time.time()
-                self.subscribed_symbols.add(symbol)
-                self.last_volume[symbol] = vol
-                logger.info(f"Received tick for {symbol}: LTP={ltp}, Volume={vol}, LastQty={last_qty}")
+                self.missing_symbols.discard(symbol)
+                self.last_volume[sid] = vol
+                logger.debug("Received tick for %s: LTP=%s, Volume=%s, LastQty=%s", symbol, ltp, vol, last_qty)
             else:
-                logger.debug(f"Non-tick or invalid message for symbol: {symbol}, ltp: {ltp}")
+                logger.debug("Non-tick or invalid message for symbol: %s, ltp: %s", symbol, ltp)
         except Exception as e:
             logger.error(f"Error processing message: {e}")
 
@@ -110,35 +143,31 @@ class FyersWebSocketClient:
         self._subscribe()
 
     def _subscribe(self) -> None:
-        """Subscribe to symbols in batches with individual retries."""
+        """Subscribe to symbols in batches of 50.
+
+        FyersDataSocket.subscribe() logs and swallows its own errors and returns None, so there is
+        no per-batch failure to retry here; lost subscriptions are recovered by _on_error and the
+        watchdog's periodic resubscribe, and symbols without ticks show up in missing_symbols.
+        """
         max_attempts = 3
         batch_size = 50
         for attempt in range(1, max_attempts + 1):
             try:
                 for i in range(0, len(self.symbols), batch_size):
-                    batch = self.symbols[i:i + batch_size]
-                    response = self.ws.subscribe(symbols=batch, data_type="SymbolUpdate")
-                    logger.info(f"Subscription response for batch {i//batch_size + 1}: {response}")
-                    if response is None:
-                        for symbol in batch:
-                            try:
-                                response = self.ws.subscribe(symbols=[symbol], data_type="SymbolUpdate")
-                                logger.info(f"Individual subscription for {symbol}: {response}")
-                            except Exception as e:
-                                logger.error(f"Failed to subscribe to {symbol}: {e}")
+                    self.ws.subscribe(symbols=self.symbols[i:i + batch_size], data_type="SymbolUpdate")
                 self.ws.keep_running()
                 logger.info("Subscription request sent")
                 break
             except Exception as e:
                 logger.error(f"Subscription attempt {attempt}/{max_attempts} failed: {e}")
                 if attempt < max_attempts:
-                    time.sleep(2 ** attempt)
+                    time.sleep(backoff(attempt))
                 else:
                     raise RuntimeError("Failed to subscribe after retries")
         # Log missing symbols after subscription
-        missing_symbols = set(self.symbols) - self.subscribed_symbols
-        if missing_symbols:
-            logger.warning(f"Subscribed symbols missing ticks: {missing_symbols}")
+        if self.missing_symbols:
+            # copy() is a single C call, so it cannot race the socket thread's discard()
+            logger.warning("Subscribed symbols missing ticks: %s", self.missing_symbols.copy())
 
     def _on_error(self, message: Dict[str, Any]) -> None:
         """Handle WebSocket errors."""
@@ -153,48 +182,55 @@ class FyersWebSocketClient:
         """Handle WebSocket closure."""
         logger.warning(f"WebSocket closed: {message}")
 
-    def start(self):
-        """Start the WebSocket client with retry logic."""
+    async def start(self):
+        """Start the WebSocket client with retry logic and watch for tick stalls."""
         max_retries = 5
         attempt = 0
-        last_subscription_time = time.time()
         while attempt < max_retries:
             try:
-                self.ws.connect()
+                await asyncio.to_thread(self.ws.connect)
                 logger.info("WebSocket connection initiated")
+                next_resubscribe = time.monotonic() + RESUBSCRIBE_INTERVAL
+                next_fallback = 0.0
                 while True:
-                    time.sleep(60)
-                    # Periodic re-subscription every 5 minutes
-                    if time.time() - last_subscription_time > 300:
+                    if time.monotonic() >= next_resubscribe:
                         try:
-                            self._subscribe()
-                            last_subscription_time = time.time()
+                            # _subscribe blocks on SDK calls and retry sleeps, so keep it off the loop
+                            await asyncio.to_thread(self._subscribe)
                             logger.info("Periodic re-subscription completed")
                         except Exception as e:
                             logger.error(f"Periodic re-subscription failed: {e}")
-                    # Check for ticks
-                    if time.time() - self.last_tick_time > 120:
+                        next_resubscribe = time.monotonic() + RESUBSCRIBE_INTERVAL
+                    if time.time() - self.last_tick_time >= TICK_TIMEOUT and time.monotonic() >= next_fallback:
                         logger.warning("No ticks received for 2 minutes. Fetching fallback quotes.")
-                        batch_size = 10
-                        for i in range(0, len(self.symbols), batch_size):
-                            batch = self.symbols[i:i + batch_size]
-                            quotes = self.fetch_quote_fallback(batch)
-                            for quote in quotes:
-                                if quote and quote["symbol"] in self.tick_queues:
-                                    self.tick_queues[quote["symbol"]].put(quote)
-                                    logger.info(f"Fallback quote for {quote['symbol']}")
-                    # Log missing symbols
-                    missing_symbols = set(self.symbols) - self.subscribed_symbols
-                    if missing_symbols:
-                        logger.warning(f"Symbols missing ticks: {missing_symbols}")
+                        await self._fallback_all()
+                        # Log missing symbols
+                        if self.missing_symbols:
+                            logger.warning("Symbols missing ticks: %s", self.missing_symbols.copy())
+                        next_fallback = time.monotonic() + TICK_TIMEOUT
+                    # Sleep until the next deadline; ticks arriving meanwhile push the stall deadline out
+                    stall_in = max(TICK_TIMEOUT - (time.time() - self.last_tick_time), next_fallback - time.monotonic())
+                    await asyncio.sleep(max(0.0, min(stall_in, next_resubscribe - time.monotonic())))
             except Exception as e:
                 attempt += 1
                 logger.error(f"Attempt {attempt}/{max_retries} failed: {e}")
                 if attempt < max_retries:
-                    time.sleep(5 * attempt)
+                    await asyncio.sleep(backoff(attempt, base=5, cap=120))
                 else:
                     raise RuntimeError("Failed to connect WebSocket after retries")
 
+    async def _fetch_quotes(self, symbols: List[str]) -> List[Dict[str, Any]]:
+        async with self.limiter:
+            return await asyncio.to_thread(self.fetch_quote_fallback, symbols)
+
+    async def _fallback_all(self, batch_size: int = QUOTES_BATCH_SIZE):
+        """Fetch REST quotes for every symbol, with all batches in flight under the rate limiter."""
+        batches = [self.symbols[i:i + batch_size] for i in range(0, len(self.symbols), batch_size)]
+        for quotes in await asyncio.gather(*(self._fetch_quotes(batch) for batch in batches)):
+            for quote in quotes:
+                if self.put_quote(quote):
+                    logger.info(f"Fallback quote for {quote['symbol']}")
+
     def stop(self):
         """Stop the WebSocket client."""
         try:
@@ -204,42 +240,49 @@ class FyersWebSocketClient:
         except Exception as e:
             logger.error(f"Error during WebSocket stop: {e}")
 
-    def fetch_quote_fallback(self, symbols: List[str]) -> List[Dict[str, Any]]:
-        """Fetch fallback quotes for symbols via REST API."""
-        try:
-            response = self.fyers.quotes({"symbols": ",".join(symbols)})
-            logger.debug(f"Batch fallback quote response for {len(symbols)} symbols")
-            results = []
+    def put_quote(self, quote: Dict[str, Any]) -> bool:
+        """Buffer a fallback REST quote alongside WebSocket ticks."""
+        return self.ticks.put(quote["symbol"], quote["timestamp"], quote["ltp"], quote.get("volume") or 0)
+
+    def fetch_quotes_batch(self, symbols: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Fetch raw quote values keyed by symbol, one quotes() call per QUOTES_BATCH_SIZE symbols."""
+        quotes = {}
+        for i in range(0, len(symbols), QUOTES_BATCH_SIZE):
+            chunk = symbols[i:i + QUOTES_BATCH_SIZE]
+            try:
+                response = self.fyers.quotes({"symbols": ",".join(chunk)})
+            except Exception as e:
+                logger.error(f"Error fetching batch quotes: {e}")
+                continue
             if isinstance(response, dict) and response.get("s") == "ok" and response.get("d"):
-                for quote in response["d"]:
-                    timestamp = pd.Timestamp.now(tz="Asia/Kolkata")
-                    if quote["v"].get("lp") is not None:
-                        results.append({
-                            "symbol": quote["n"],
-                            "timestamp": timestamp,
-                            "ltp": quote["v"].get("lp"),
-                            "volume": quote["v"].get("volume")
-                        })
-                    else:
-                        logger.warning(f"No LTP in quote for {quote['n']}: {quote}")
+                logger.debug(f"Batch fallback quote response for {len(chunk)} symbols")
+                quotes.update({item["n"]: item["v"] for item in response["d"]})
             else:
                 logger.warning(f"Failed to fetch batch quotes: {response}")
-            return results
-        except Exception as e:
-            logger.error(f"Error fetching batch quotes: {e}")
-            return []
+        return quotes
+
+    def fetch_quote_fallback(self, symbols: List[str]) -> List[Dict[str, Any]]:
+        """Fetch fallback quotes for symbols via REST API as tick records."""
+        quotes = self.fetch_quotes_batch(symbols)
+        timestamp = time.time_ns()
+        results = []
+        for symbol, values in quotes.items():
+            if values.get("lp") is not None:
+                results.append({
+                    "symbol": symbol,
+                    "timestamp": timestamp,
+                    "ltp": values.get("lp"),
+                    "volume": values.get("volume")
+                })
+            else:
+                logger.warning(f"No LTP in quote for {symbol}: {values}")
+        return results
 
 if __name__ == "__main__":
+    if uvloop is not None:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
     ws = FyersWebSocketClient()
     try:
-        ws.start()
-        while True:
-            time.sleep(60)
-            for symbol in ws.tick_queues:
-                if ws.tick_queues[symbol].qsize() == 0:
-                    quote = ws.fetch_quote_fallback([symbol])
-                    if quote:
-                        ws.tick_queues[symbol].put(quote[0])
-                        logger.info(f"Fallback quote for {symbol}: {quote[0]}")
+        asyncio.run(ws.start())
     except KeyboardInterrupt:
-        ws.stop()
\ No newline at end of file
+        ws.stop()
@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+from typing import Optional, Tuple
+from config.config import OHLCV_BUFFER_CAPACITY
+
+COLUMNS = ["timestamp", "open", "high", "low", "close", "volume"]
+
+class OHLCVBuffer:
+    """Fixed-capacity structure-of-arrays store of one symbol's bars, appended in time order.
+
+    A bar with the same timestamp as the latest one replaces it; once full the oldest bars are overwritten.
+    """
+    def __init__(self, capacity: int = OHLCV_BUFFER_CAPACITY):
+        self.capacity = capacity
+        self.ts = np.empty(capacity, dtype=np.int64)  # epoch ns
+        self.open = np.empty(capacity, dtype=np.float64)
+        self.high = np.empty(capacity, dtype=np.float64)
+        self.low = np.empty(capacity, dtype=np.float64)
+        self.close = np.empty(capacity, dtype=np.float64)
+        self.volume = np.empty(capacity, dtype=np.int64)
+        self.write_idx = 0  # total bars written
+
+    def append(self, timestamp: int, open_: float, high: float, low: float, close: float, volume: int):
+        """Store one bar stamped in epoch nanoseconds."""
+        if self.write_idx and self.ts[(self.write_idx - 1) % self.capacity] == timestamp:
+            i = (self.write_idx - 1) % self.capacity
+        else:
+            i = self.write_idx % self.capacity
+            self.write_idx += 1
+        self.ts[i] = timestamp
+        self.open[i] = open_
+        self.high[i] = high
+        self.low[i] = low
+        self.close[i] = close
+        self.volume[i] = volume
+
+    def __len__(self) -> int:
+        return min(self.write_idx, self.capacity)
+
+    def columns(self, last: Optional[int] = None) -> Tuple[np.ndarray, ...]:
+        """Return (ts, open, high, low, close, volume) for the stored bars, or only the latest `last`, in write order."""
+        n = len(self) if last is None else min(last, len(self))
+        idx = np.arange(self.write_idx - n, self.write_idx) % self.capacity
+        if n and idx[0] < idx[-1]:
+            idx = slice(idx[0], idx[-1] + 1)  # contiguous: slice views instead of gathers
+        return self.ts[idx], self.open[idx], self.high[idx], self.low[idx], self.close[idx], self.volume[idx]
+
+    def as_dataframe(self, last: Optional[int] = None) -> pd.DataFrame:
+        """Build a DataFrame of the stored bars (or only the latest `last`) in time order with IST timestamps."""
+        ts, open_, high, low, close, volume = self.columns(last)
+        timestamp = pd.DatetimeIndex(ts.view("datetime64[ns]")).tz_localize("UTC").tz_convert("Asia/Kolkata")
+        return pd.DataFrame({
+            "timestamp": timestamp,
+            "open": open_,
+            "high": high,
+            "low": low,
+            "close": close,
+            "volume": volume,
+        }, columns=COLUMNS)
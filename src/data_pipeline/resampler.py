@@ -1,75 +1,92 @@
 import time
+import numpy as np
 import pandas as pd
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
 from src.utils.config_loader import load_config
 from src.utils.logger import get_logger
 from src.indicators.macd import MACD
 from src.indicators.cal_input import CalInput
-from config.config import TIMEFRAMES, MACD_PARAMS, HIGHER_TIMEFRAMES
+from src.data_pipeline.ohlcv_buffer import OHLCVBuffer
+from config.config import TIMEFRAMES, MACD_PARAMS, HIGHER_TIMEFRAMES, INDICATOR_WORKERS
 
 logger = get_logger(__name__)
 
 class Resampler:
-    def __init__(self, tick_queues, storage):
-        self.tick_queues = tick_queues
+    def __init__(self, ticks, storage):
+        self.ticks = ticks
+        self.symbols = ticks.symbols
         self.storage = storage
         self.config = load_config("config/config.yaml")
         self.timeframes = TIMEFRAMES
+        # (name, seconds, nanoseconds) per timeframe, parsed once instead of on every loop pass
+        self._tf_spec = [(tf, int(pd.Timedelta(tf).total_seconds()), int(pd.Timedelta(tf).value)) for tf in self.timeframes]
         self.ohlcv_data = {
             symbol: {
                 tf: pd.DataFrame(columns=["timestamp", "open", "high", "low", "close", "volume"])
-                for tf in self.timeframes + ["1s"]
+                for tf in self.timeframes
             }
-            for symbol in tick_queues.keys()
+            for symbol in self.symbols
         }
+        # 1s bars grow every second, so they live in preallocated columns rather than a growing DataFrame
+        self.second_bars = {symbol: OHLCVBuffer() for symbol in self.symbols}
         self.running = False
 
     async def aggregate_ticks(self):
         try:
-            for symbol, queue in self.tick_queues.items():
-                ticks = []
-                while not queue.empty():
-                    ticks.append(queue.get())
-                if ticks:
-                    df = pd.DataFrame(ticks)
-                    if 'timestamp' not in df.columns or df['timestamp'].isna().any():
-                        logger.error(f"Invalid timestamps in ticks for {symbol}: {df.head()}")
-                        continue
-                    timestamp = df["timestamp"].max().floor("1s")
-                    ohlcv = {
-                        "timestamp": timestamp,
-                        "open": df["ltp"].iloc[0],
-                        "high": df["ltp"].max(),
-                        "low": df["ltp"].min(),
-                        "close": df["ltp"].iloc[-1],
-                        "volume": df["volume"].iloc[-1]
-                    }
-                    self.ohlcv_data[symbol]["1s"] = pd.concat(
-                        [self.ohlcv_data[symbol]["1s"], pd.DataFrame([ohlcv])],
-                        ignore_index=True
-                    ).drop_duplicates(subset=["timestamp"], keep="last")
-                    self.storage.save_ohlcv(symbol, self.ohlcv_data[symbol]["1s"], "1s")
-                    logger.debug(f"Aggregated 1s OHLCV for {symbol}: {ohlcv}")
-                else:
-                    logger.debug(f"No ticks for {symbol} in this interval")
+            batch = self.ticks.drain()
+            if batch["sym"].size == 0:
+                logger.debug("No ticks in this interval")
+                return
+            # Group the drained ticks by symbol id; the stable sort keeps arrival order within each symbol
+            order = np.argsort(batch["sym"], kind="stable")
+            sids, starts = np.unique(batch["sym"][order], return_index=True)
+            updated = {}
+            for sid, idx in zip(sids, np.split(order, starts[1:])):
+                symbol = self.symbols[sid]
+                ltp = batch["ltp"][idx]
+                # Ticks carry epoch nanoseconds; floor the bar's timestamp to the second in integer space
+                timestamp = int(batch["timestamp"][idx].max()) // 1_000_000_000 * 1_000_000_000
+                bars = self.second_bars[symbol]
+                bar = (timestamp, ltp[0], ltp.max(), ltp.min(), ltp[-1], batch["volume"][idx[-1]])
+                bars.append(*bar)
+                # Earlier bars were saved on previous passes and saves merge, so only the new bar is written
+                updated[symbol] = bars.as_dataframe(last=1)
+                logger.debug("Aggregated 1s OHLCV for %s: %s", symbol, bar)
+            self.storage.save_ohlcv_batch("1s", updated)
         except Exception as e:
             logger.error(f"Error in aggregate_ticks: {e}", exc_info=True)
 
-    async def resample_to_timeframe(self, symbol: str, timeframe: str) -> pd.DataFrame:
+    async def resample_to_timeframe(self, symbol: str, timeframe: str, tf_ns: Optional[int] = None, save: bool = True) -> pd.DataFrame:
         try:
-            df = self.ohlcv_data[symbol]["1s"].set_index("timestamp")
-            if df.empty:
+            bars = self.second_bars[symbol]
+            if not len(bars):
                 logger.warning(f"No 1s OHLCV data for {symbol} to resample to {timeframe}")
                 return pd.DataFrame()
-            resampled = df.resample(timeframe).agg({
-                "open": "first",
-                "high": "max",
-                "low": "min",
-                "close": "last",
-                "volume": "sum"
-            }).dropna()
+            ts, open_, high, low, close, volume = bars.columns()
+            if tf_ns is None:
+                tf_ns = int(pd.Timedelta(timeframe).value)
+            # Epoch-floored buckets match IST-midnight bins because the +05:30 offset is a whole number of buckets
+            buckets = ts // tf_ns
+            if (np.diff(buckets) < 0).any():
+                order = np.argsort(buckets, kind="stable")
+                ts, open_, high, low, close, volume = (a[order] for a in (ts, open_, high, low, close, volume))
+                buckets = buckets[order]
+            # First row of each bucket; reduceat aggregates each run up to the next edge
+            edges = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+            ends = np.r_[edges[1:], len(ts)] - 1
+            index = pd.DatetimeIndex((buckets[edges] * tf_ns).view("datetime64[ns]"), name="timestamp")
+            resampled = pd.DataFrame({
+                "open": open_[edges],
+                "high": np.maximum.reduceat(high, edges),
+                "low": np.minimum.reduceat(low, edges),
+                "close": close[ends],
+                "volume": np.add.reduceat(volume, edges),
+            }, index=index.tz_localize("UTC").tz_convert("Asia/Kolkata"))
             self.ohlcv_data[symbol][timeframe] = resampled.reset_index()
-            self.storage.save_ohlcv(symbol, self.ohlcv_data[symbol][timeframe], timeframe)
+            if save:
+                self.storage.save_ohlcv(symbol, self.ohlcv_data[symbol][timeframe], timeframe)
             logger.info(f"Resampled {symbol} to {timeframe} with {len(resampled)} candles")
             return resampled
         except Exception as e:
@@ -99,22 +116,36 @@ class Resampler:
 
     async def process(self):
         self.running = True
-        last_resample = {tf: 0.0 for tf in self.timeframes}  # fix here
-        while self.running:
-            try:
-                await self.aggregate_ticks()
-                now = time.time()
-                for tf in self.timeframes:
-                    seconds = pd.Timedelta(tf).total_seconds()
-                    if now - last_resample[tf] >= seconds:
-                        for symbol in self.tick_queues:
-                            await self.resample_to_timeframe(symbol, tf)
-                            self.compute_indicators(symbol, tf)
-                        last_resample[tf] = now
-                        logger.debug(f"Processed resampling for {tf}")
-                await asyncio.sleep(1)
-            except Exception as e:
-                logger.error(f"Error in process loop: {e}", exc_info=True)
+        # Last wall-clock bucket dispatched per timeframe; a timeframe is due once the bucket index moves on
+        last_bucket = {tf: -1 for tf in self.timeframes}
+        # pandas' EWM kernels release the GIL, so per-symbol indicators overlap on threads.
+        # The pool lives for one process() run and waits for in-flight work on exit.
+        with ThreadPoolExecutor(max_workers=INDICATOR_WORKERS) as pool:
+            while self.running:
+                started = time.monotonic()
+                try:
+                    await self.aggregate_ticks()
+                    now = int(time.time())
+                    for tf, seconds, tf_ns in self._tf_spec:
+                        bucket = now // seconds
+                        if bucket != last_bucket[tf]:
+                            resampled = {}
+                            for symbol in self.symbols:
+                                if not (await self.resample_to_timeframe(symbol, tf, tf_ns, save=False)).empty:
+                                    resampled[symbol] = self.ohlcv_data[symbol][tf]
+                            # One file open per timeframe instead of one per symbol
+                            self.storage.save_ohlcv_batch(tf, resampled)
+                            loop = asyncio.get_running_loop()
+                            await asyncio.gather(*(
+                                loop.run_in_executor(pool, self.compute_indicators, symbol, tf)
+                                for symbol in self.symbols
+                            ))
+                            last_bucket[tf] = bucket
+                            logger.debug("Processed resampling for %s", tf)
+                except Exception as e:
+                    logger.error(f"Error in process loop: {e}", exc_info=True)
+                # Sleep out the rest of the second so the loop period does not drift by the work time
+                await asyncio.sleep(max(0.0, 1.0 - (time.monotonic() - started)))
 
     async def start(self):
         try:
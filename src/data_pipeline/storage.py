@@ -1,12 +1,102 @@
 import pandas as pd
+import numpy as np
+import logging
 import os
 import time
 from pathlib import Path
 from threading import Lock
+from typing import Dict
 from src.utils.logger import get_logger
+from src.utils.retry import backoff
+from config.config import HDF5_COMPRESSION
 
 logger = get_logger(__name__)
 
+# Compression for every table we write: blosc:lz4 (the default) is fast enough to sit on the write path.
+# PyTables enables byte-shuffle by default, which is what makes the monotonic timestamp column compress well.
+HDF5_COMPLIB = HDF5_COMPRESSION
+HDF5_COMPLEVEL = 5
+
+# The HDF5 library is not thread-safe, and PyTables refuses to open a file read-only while a
+# writable handle on it is open (or the reverse). Backfill reads and writes on its IO pool and
+# MACD/CalInput each build their own Storage, so every open, reads included, takes this one lock.
+# A reader-writer split would not help: concurrent readers still share the non-thread-safe library.
+_HDF5_LOCK = Lock()
+
+# HDF5 chunk cache for every handle we open (merge-on-write reads the existing rows too):
+# 64 MiB, prime slot count, evict fully-read chunks first
+HDF5_CHUNK_CACHE = {"chunk_cache_size": 64 * 1024 * 1024, "chunk_cache_nelmts": 100003, "chunk_cache_preempt": 1.0}
+
+def epoch_to_ist(seconds) -> pd.DatetimeIndex:
+    """Convert Unix epoch seconds to Asia/Kolkata timestamps with plain int64 arithmetic."""
+    ns = np.asarray(seconds, dtype=np.int64) * 1_000_000_000
+    return pd.DatetimeIndex(ns.view("datetime64[ns]")).tz_localize("UTC").tz_convert("Asia/Kolkata")
+
+# Below 2**16 float32 spacing is at most 1/256, so a two-decimal price is stored within 1/512
+# (under half a paisa) and rounds back to the exact paisa; frames with larger quotes stay float64
+FLOAT32_PRICE_LIMIT = 2 ** 16
+PRICE_COLUMNS = ["open", "high", "low", "close"]
+
+def _downcast_ohlcv(df: pd.DataFrame) -> pd.DataFrame:
+    """Narrow OHLC to float32 and volume to int32 when every value fits; other columns are left as is."""
+    prices = [c for c in PRICE_COLUMNS if c in df.columns and df[c].dtype == np.float64]
+    if prices:
+        peak = np.nanmax(np.abs(df[prices].to_numpy())) if len(df) else 0.0
+        if peak < FLOAT32_PRICE_LIMIT:
+            df = df.astype({c: np.float32 for c in prices})
+        else:
+            logger.debug(f"Keeping float64 prices, peak {peak} exceeds float32 precision")
+    if "volume" in df.columns and df["volume"].dtype == np.int64 and len(df):
+        info = np.iinfo(np.int32)
+        if info.min <= df["volume"].min() and df["volume"].max() <= info.max:
+            df = df.astype({"volume": np.int32})
+    return df
+
+def _fits_stored_dtypes(df: pd.DataFrame, dtypes: pd.Series) -> bool:
+    """True if df's OHLCV values survive a cast to the narrowed dtypes a table was stored with."""
+    prices = [c for c in PRICE_COLUMNS if c in df.columns and dtypes.get(c) == np.float32]
+    if prices and len(df) and np.nanmax(np.abs(df[prices].to_numpy(dtype=np.float64))) >= FLOAT32_PRICE_LIMIT:
+        return False
+    if "volume" in df.columns and dtypes.get("volume") == np.int32 and len(df):
+        info = np.iinfo(np.int32)
+        if df["volume"].min() < info.min or df["volume"].max() > info.max:
+            return False
+    return True
+
+def _write_table(store: pd.HDFStore, key: str, df: pd.DataFrame):
+    """Replace key with df as a compressed table indexed on timestamp only.
+
+    Appending rather than put() lets PyTables size chunks from expectedrows; indexing every
+    column (data_columns=True) makes each write build and store a column index nobody queries.
+    """
+    if f"/{key}" in store:
+        store.remove(key)
+    data_columns = ['timestamp'] if 'timestamp' in df.columns else None
+    store.append(key, df, data_columns=data_columns, complib=HDF5_COMPLIB, complevel=HDF5_COMPLEVEL,
+                 expectedrows=len(df))
+
+# Directories this process has already created; every Storage instance and save shares it
+_ensured_dirs = set()
+
+def _ensure_dir(path: Path):
+    """makedirs once per path per process instead of on every Storage() and save."""
+    if path in _ensured_dirs:
+        return
+    os.makedirs(path, exist_ok=True)
+    _ensured_dirs.add(path)
+    logger.debug(f"Ensured directory exists: {path}")
+
+def _log_saved_size(file_path: Path, resolved_path: Path):
+    """Log the on-disk size of a just-written file with a single stat call."""
+    if not logger.isEnabledFor(logging.INFO):
+        return
+    try:
+        file_size = os.stat(file_path).st_size
+    except FileNotFoundError:
+        logger.error(f"File {resolved_path} not found after save")
+        return
+    logger.info(f"Verified {resolved_path}: Size {file_size} bytes")
+
 class Storage:
     def __init__(self, csv_debug=False):
             self.base_path = Path(r"C:\Users\mubas\OneDrive\Desktop\macd_pipeline")
@@ -14,9 +104,8 @@ class Storage:
             self.historical_path = self.base_path / 'data/ticks/historical'
             self.indicators_path = self.base_path / 'data/indicators'
             for path in [self.tick_path, self.historical_path, self.indicators_path]:
-                os.makedirs(path, exist_ok=True)
-                logger.info(f"Ensured directory exists: {path}")
-            self.lock = Lock()
+                _ensure_dir(path)
+            self.lock = _HDF5_LOCK
             self.csv_debug = csv_debug
 
     def save_historical(self, symbol: str, df: pd.DataFrame, timeframe: str):
@@ -24,26 +113,12 @@ class Storage:
             logger.warning(f"Empty DataFrame for {symbol} ({timeframe}). Skipping save.")
             return
         file_path = self.historical_path / f"{timeframe}.h5"
-        key = symbol.replace(":", "_")
         resolved_path = file_path.resolve()
         logger.debug(f"Saving {symbol} ({timeframe}) to {resolved_path}")
 
         # Validate and convert timestamps
-        if 'timestamp' in df.columns:
-            df['timestamp'] = pd.to_datetime(df['timestamp'], unit='s', utc=True, errors='coerce').dt.tz_convert('Asia/Kolkata')
-            if df['timestamp'].isna().any():
-                logger.error(f"Invalid timestamps found in {symbol} ({timeframe})")
-                return
-            logger.debug(f"New data timestamp range: {df['timestamp'].min()} to {df['timestamp'].max()}")
-
-        # Write test file for debugging
-        test_path = file_path.with_suffix('.txt')
-        try:
-            with open(test_path, 'w') as f:
-                f.write(f"Test write for {symbol}_{timeframe} at {pd.Timestamp.now()}")
-            logger.debug(f"Wrote test file: {test_path}")
-        except Exception as e:
-            logger.error(f"Failed to write test file {test_path}: {e}")
+        if not self._validate_timestamps(symbol, df, timeframe):
+            return
 
         # Fallback to CSV if enabled
         if self.csv_debug:
@@ -56,45 +131,113 @@ class Storage:
             return
 
         # Save to HDF5
-        with self.lock:
-            for attempt in range(1, 4):
-                try:
-                    with pd.HDFStore(resolved_path, mode='a') as store:
-                        if f"/{key}" in store:
-                            existing_df = store[key]
-                            if 'timestamp' in existing_df.columns:
-                                existing_df['timestamp'] = pd.to_datetime(existing_df['timestamp'], utc=True, errors='coerce').dt.tz_convert('Asia/Kolkata')
-                                logger.debug(f"Existing data timestamp range: {existing_df['timestamp'].min()} to {existing_df['timestamp'].max()}")
-                                # Skip merge if new data fully covers existing range
-                                if (df['timestamp'].min() <= existing_df['timestamp'].min() and 
-                                    df['timestamp'].max() >= existing_df['timestamp'].max()):
-                                    logger.info(f"New data covers existing range for {symbol} ({timeframe}). Overwriting.")
-                                else:
-                                    combined_df = pd.concat([existing_df, df], ignore_index=True)
-                                    duplicates = combined_df['timestamp'].duplicated().sum()
-                                    if duplicates:
-                                        logger.warning(f"Removed {duplicates} duplicates for {symbol} ({timeframe})")
-                                        combined_df = combined_df.drop_duplicates(subset=['timestamp'], keep='last').sort_values('timestamp')
-                                    df = combined_df
-                                    if df.empty:
-                                        logger.info(f"No data after deduplication for {symbol} ({timeframe})")
-                                        return
-                            else:
-                                logger.warning(f"No timestamp column in existing data for {symbol} ({timeframe})")
-                        # Save (overwrite existing key)
-                        store.put(key, df, format='table', data_columns=True)
-                    logger.info(f"Saved historical for {symbol} ({timeframe}) to {resolved_path}, rows: {len(df)}")
-                    if file_path.exists():
-                        file_size = os.path.getsize(file_path)
-                        logger.info(f"Verified {resolved_path}: Size {file_size} bytes")
-                    else:
-                        logger.error(f"File {resolved_path} not found after save")
-                    break
-                except Exception as e:
-                    logger.warning(f"Attempt {attempt}/3 failed for {resolved_path}: {e}")
-                    if attempt == 3:
-                        logger.error(f"Failed to save historical data for {symbol}: {e}")
-                    time.sleep(2)
+        self._write_store(file_path, lambda store: self._put_historical(store, symbol, df, timeframe),
+                          f"historical data for {symbol}")
+
+    def save_historical_batch(self, timeframe: str, frames: Dict[str, pd.DataFrame]):
+        """Write several symbols' historical frames to one timeframe file in a single open.
+
+        frames: symbol -> DataFrame, merged with existing rows exactly as save_historical does.
+        """
+        frames = {symbol: df for symbol, df in frames.items()
+                  if not df.empty and self._validate_timestamps(symbol, df, timeframe)}
+        if not frames:
+            return
+        if self.csv_debug:
+            for symbol, df in frames.items():
+                self.save_historical(symbol, df, timeframe)
+            return
+        def write(store):
+            for symbol, df in frames.items():
+                self._put_historical(store, symbol, df, timeframe)
+        self._write_store(self.historical_path / f"{timeframe}.h5", write, f"historical batch for {timeframe}")
+
+    def _write_store(self, file_path: Path, write, what: str, max_attempts: int = 3) -> bool:
+        """Open file_path under the HDF5 lock and pass the store to write(), retrying failures.
+
+        Backfill and gap-fill saves are one-shot, so a dropped write is lost for good. The lock is
+        released during the backoff so other readers and writers are not stalled behind a retry;
+        write() must tolerate a rerun, which the merge-and-dedupe _put_* helpers do.
+        """
+        resolved_path = file_path.resolve()
+        for attempt in range(1, max_attempts + 1):
+            try:
+                with self.lock, pd.HDFStore(resolved_path, mode='a', **HDF5_CHUNK_CACHE) as store:
+                    write(store)
+                break
+            except Exception as e:
+                if attempt == max_attempts:
+                    logger.error(f"Failed to save {what} to {resolved_path}: {e}", exc_info=True)
+                    return False
+                logger.warning(f"Attempt {attempt}/{max_attempts} failed for {resolved_path}: {e}")
+                time.sleep(backoff(attempt, base=0.5, cap=2.0))
+        _log_saved_size(file_path, resolved_path)
+        return True
+
+    def _validate_timestamps(self, symbol: str, df: pd.DataFrame, timeframe: str) -> bool:
+        if 'timestamp' in df.columns:
+            if pd.api.types.is_integer_dtype(df['timestamp']):
+                df['timestamp'] = epoch_to_ist(df['timestamp'])
+            else:
+                df['timestamp'] = pd.to_datetime(df['timestamp'], unit='s', utc=True, errors='coerce').dt.tz_convert('Asia/Kolkata')
+            if df['timestamp'].isna().any():
+                logger.error(f"Invalid timestamps found in {symbol} ({timeframe})")
+                return False
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"New data timestamp range: {df['timestamp'].min()} to {df['timestamp'].max()}")
+        return True
+
+    def _put_historical(self, store: pd.HDFStore, symbol: str, df: pd.DataFrame, timeframe: str):
+        key = symbol.replace(":", "_")
+        if f"/{key}" in store:
+            if self._append_if_newer(store, key, symbol, df, timeframe):
+                return
+            existing_df = store[key]
+            if 'timestamp' in existing_df.columns:
+                existing_df['timestamp'] = pd.to_datetime(existing_df['timestamp'], utc=True, errors='coerce').dt.tz_convert('Asia/Kolkata')
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(f"Existing data timestamp range: {existing_df['timestamp'].min()} to {existing_df['timestamp'].max()}")
+                # Skip merge if new data fully covers existing range
+                if (df['timestamp'].min() <= existing_df['timestamp'].min() and 
+                    df['timestamp'].max() >= existing_df['timestamp'].max()):
+                    logger.info(f"New data covers existing range for {symbol} ({timeframe}). Overwriting.")
+                else:
+                    combined_df = pd.concat([existing_df, df], ignore_index=True)
+                    rows = len(combined_df)
+                    combined_df = combined_df.drop_duplicates(subset=['timestamp'], keep='last')
+                    if len(combined_df) < rows:
+                        logger.warning(f"Removed {rows - len(combined_df)} duplicates for {symbol} ({timeframe})")
+                        combined_df = combined_df.sort_values('timestamp')
+                    df = combined_df
+                    if df.empty:
+                        logger.info(f"No data after deduplication for {symbol} ({timeframe})")
+                        return
+            else:
+                logger.warning(f"No timestamp column in existing data for {symbol} ({timeframe})")
+        # Save (overwrite existing key)
+        _write_table(store, key, _downcast_ohlcv(df))
+        logger.info(f"Saved historical for {symbol} ({timeframe}) to {store.filename}, rows: {len(df)}")
+
+    def _append_if_newer(self, store: pd.HDFStore, key: str, symbol: str, df: pd.DataFrame, timeframe: str) -> bool:
+        """Append df in place when every new row is later than the stored ones; False means a full merge is needed."""
+        if 'timestamp' not in df.columns:
+            return False
+        try:
+            head = store.select(key, start=0, stop=1)
+            if set(head.columns) != set(df.columns):
+                return False
+            # Indexed lookup of stored rows at or after the first new one, instead of reading the whole column
+            first = df['timestamp'].min()
+            if len(store.select(key, where="timestamp >= first", columns=['timestamp'])):
+                return False
+            if not _fits_stored_dtypes(df, head.dtypes):
+                return False  # the full rewrite widens the stored columns instead
+            store.append(key, df[head.columns].astype(head.dtypes.to_dict()), data_columns=['timestamp'])
+        except (TypeError, ValueError) as e:
+            logger.debug(f"Append fast path unavailable for {symbol} ({timeframe}): {e}")
+            return False
+        logger.info(f"Appended {len(df)} rows for {symbol} ({timeframe}) to {store.filename}")
+        return True
 
     def load_historical(self, symbol: str, timeframe: str) -> pd.DataFrame:
         file_path = self.historical_path / f"{timeframe}.h5"
@@ -102,7 +245,7 @@ class Storage:
         resolved_path = file_path.resolve()
         try:
             if file_path.exists():
-                with pd.HDFStore(resolved_path, mode='r') as store:
+                with self.lock, pd.HDFStore(resolved_path, mode='r', **HDF5_CHUNK_CACHE) as store:
                     if f"/{key}" in store:
                         df = store[key]
                         if isinstance(df, pd.Series):
@@ -128,55 +271,100 @@ class Storage:
             logger.error(f"Error loading data for {symbol} ({timeframe}): {e}")
             return pd.DataFrame()
 
+    def load_timestamps(self, symbol: str, timeframe: str, start=None, end=None) -> pd.DataFrame:
+        """
+        Load only the timestamp column, optionally limited to [start, end).
+        The range is pushed down to PyTables so rows outside it are never read.
+        """
+        file_path = self.historical_path / f"{timeframe}.h5"
+        key = symbol.replace(":", "_")
+        resolved_path = file_path.resolve()
+        try:
+            if not file_path.exists():
+                logger.debug(f"File {resolved_path} does not exist for {symbol} ({timeframe})")
+                return pd.DataFrame()
+            with self.lock, pd.HDFStore(resolved_path, mode='r', **HDF5_CHUNK_CACHE) as store:
+                if f"/{key}" not in store:
+                    logger.debug(f"No data for {symbol} ({timeframe}) in {resolved_path}")
+                    return pd.DataFrame()
+                where = []
+                if start is not None:
+                    where.append("timestamp >= start")
+                if end is not None:
+                    where.append("timestamp < end")
+                df = store.select(key, where=where or None, columns=['timestamp'])
+                logger.debug(f"Loaded {len(df)} timestamps for {symbol} ({timeframe})")
+                return df
+        except Exception as e:
+            logger.error(f"Error loading timestamps for {symbol} ({timeframe}): {e}")
+            return pd.DataFrame()
+
     def save_ohlcv(self, symbol: str, df: pd.DataFrame, timeframe: str):
         if df.empty:
             logger.warning(f"Empty OHLCV DataFrame for {symbol} ({timeframe}). Skipping save.")
             return
         file_path = self.historical_path / f"{timeframe}.h5"
-        key = symbol.replace(":", "_")
         resolved_path = file_path.resolve()
         logger.debug(f"Saving OHLCV {symbol} ({timeframe}) to {resolved_path}, rows: {len(df)}")
-        
+
+        if not self._validate_ohlcv_timestamps(symbol, df, timeframe):
+            return
+
+        self._write_store(file_path, lambda store: self._put_ohlcv(store, symbol, df, timeframe),
+                          f"OHLCV for {symbol}")
+
+    def save_ohlcv_batch(self, timeframe: str, frames: Dict[str, pd.DataFrame]):
+        """Write several symbols' OHLCV frames to one timeframe file in a single open.
+
+        frames: symbol -> DataFrame, merged with existing rows exactly as save_ohlcv does.
+        """
+        frames = {symbol: df for symbol, df in frames.items()
+                  if not df.empty and self._validate_ohlcv_timestamps(symbol, df, timeframe)}
+        if not frames:
+            return
+        def write(store):
+            for symbol, df in frames.items():
+                self._put_ohlcv(store, symbol, df, timeframe)
+        self._write_store(self.historical_path / f"{timeframe}.h5", write, f"OHLCV batch for {timeframe}")
+
+    def _validate_ohlcv_timestamps(self, symbol: str, df: pd.DataFrame, timeframe: str) -> bool:
         if 'timestamp' in df.columns:
             df['timestamp'] = pd.to_datetime(df['timestamp'], utc=True, errors='coerce').dt.tz_convert('Asia/Kolkata')
             if df['timestamp'].isna().any():
                 logger.error(f"Invalid timestamps in OHLCV for {symbol} ({timeframe})")
-                return
-            logger.debug(f"Timestamp range: {df['timestamp'].min()} to {df['timestamp'].max()}")
+                return False
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Timestamp range: {df['timestamp'].min()} to {df['timestamp'].max()}")
+        return True
 
-        with self.lock:
-            for attempt in range(1, 4):
-                try:
-                    with pd.HDFStore(resolved_path, mode='a') as store:
-                        if f"/{key}" in store:
-                            existing_df = store[key]
-                            if 'timestamp' in existing_df.columns:
-                                existing_df['timestamp'] = pd.to_datetime(existing_df['timestamp'], utc=True, errors='coerce').dt.tz_convert('Asia/Kolkata')
-                                logger.debug(f"Existing data rows: {len(existing_df)}, Timestamp range: {existing_df['timestamp'].min()} to {existing_df['timestamp'].max()}")
-                                combined_df = pd.concat([existing_df, df], ignore_index=True)
-                                duplicates = combined_df['timestamp'].duplicated().sum()
-                                if duplicates:
-                                    logger.warning(f"Removed {duplicates} duplicates for {symbol} ({timeframe})")
-                                    combined_df = combined_df.drop_duplicates(subset=['timestamp'], keep='last').sort_values('timestamp')
-                                df = combined_df
-                        store.put(key, df, format='table', data_columns=True)
-                    logger.info(f"Saved OHLCV for {symbol} ({timeframe}) to {resolved_path}, rows: {len(df)}")
-                    if file_path.exists():
-                        file_size = os.path.getsize(file_path)
-                        logger.info(f"Verified {resolved_path}: Size {file_size} bytes")
-                    break
-                except Exception as e:
-                    logger.error(f"Attempt {attempt}/3 failed for {resolved_path}: {e}", exc_info=True)
-                    if attempt == 3:
-                        logger.error(f"Failed to save OHLCV for {symbol}: {e}")
+    def _put_ohlcv(self, store: pd.HDFStore, symbol: str, df: pd.DataFrame, timeframe: str):
+        key = symbol.replace(":", "_")
+        if f"/{key}" in store:
+            # The 1s path saves only the newest bar each second; append it rather than rewrite the key
+            if self._append_if_newer(store, key, symbol, df, timeframe):
+                return
+            existing_df = store[key]
+            if 'timestamp' in existing_df.columns:
+                existing_df['timestamp'] = pd.to_datetime(existing_df['timestamp'], utc=True, errors='coerce').dt.tz_convert('Asia/Kolkata')
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(f"Existing data rows: {len(existing_df)}, Timestamp range: {existing_df['timestamp'].min()} to {existing_df['timestamp'].max()}")
+                combined_df = pd.concat([existing_df, df], ignore_index=True)
+                rows = len(combined_df)
+                combined_df = combined_df.drop_duplicates(subset=['timestamp'], keep='last')
+                if len(combined_df) < rows:
+                    logger.warning(f"Removed {rows - len(combined_df)} duplicates for {symbol} ({timeframe})")
+                    combined_df = combined_df.sort_values('timestamp')
+                df = combined_df
+        df = _downcast_ohlcv(df)
+        _write_table(store, key, df)
+        logger.info(f"Saved OHLCV for {symbol} ({timeframe}) to {store.filename}, rows: {len(df)}")
 
     def save_indicators(self, symbol: str, df: pd.DataFrame, timeframe: str, indicator_type: str):
             if df.empty:
                 logger.warning(f"Empty DataFrame for {symbol} ({timeframe}, {indicator_type}). Skipping save.")
                 return
             file_path = self.indicators_path / indicator_type / f"{timeframe}.h5"
-            file_path.parent.mkdir(parents=True, exist_ok=True)  # Ensure indicator_type directory exists
-            key = symbol.replace(":", "_")
+            _ensure_dir(file_path.parent)  # Ensure indicator_type directory exists
             resolved_path = file_path.resolve()
             logger.debug(f"Saving {indicator_type} for {symbol} ({timeframe}) to {resolved_path}")
 
@@ -186,7 +374,8 @@ class Storage:
                 if df['timestamp'].isna().any():
                     logger.error(f"Invalid timestamps found in {symbol} ({timeframe}, {indicator_type})")
                     return
-                logger.debug(f"New data timestamp range: {df['timestamp'].min()} to {df['timestamp'].max()}")
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(f"New data timestamp range: {df['timestamp'].min()} to {df['timestamp'].max()}")
 
             # Fallback to CSV if enabled
             if self.csv_debug:
@@ -200,64 +389,55 @@ class Storage:
                 return
 
             # Save to HDF5
-            with self.lock:
-                for attempt in range(1, 4):
-                    try:
-                        with pd.HDFStore(resolved_path, mode='a') as store:
-                            if f"/{key}" in store:
-                                existing_df = store[key]
-                                if 'timestamp' in existing_df.columns:
-                                    existing_df['timestamp'] = pd.to_datetime(existing_df['timestamp'], utc=True, errors='coerce').dt.tz_convert('Asia/Kolkata')
-                                    logger.debug(f"Existing data timestamp range: {existing_df['timestamp'].min()} to {existing_df['timestamp'].max()}")
-                                    if (df['timestamp'].min() <= existing_df['timestamp'].min() and 
-                                        df['timestamp'].max() >= existing_df['timestamp'].max()):
-                                        logger.info(f"New data covers existing range for {symbol} ({timeframe}, {indicator_type}). Overwriting.")
-                                    else:
-                                        combined_df = pd.concat([existing_df, df], ignore_index=True)
-                                        duplicates = combined_df['timestamp'].duplicated().sum()
-                                        if duplicates:
-                                            logger.warning(f"Removed {duplicates} duplicates for {symbol} ({timeframe}, {indicator_type})")
-                                            combined_df = combined_df.drop_duplicates(subset=['timestamp'], keep='last').sort_values('timestamp')
-                                        df = combined_df
-                                        if df.empty:
-                                            logger.info(f"No data after deduplication for {symbol} ({timeframe}, {indicator_type})")
-                                            return
-                                else:
-                                    logger.warning(f"No timestamp column in existing data for {symbol} ({timeframe}, {indicator_type})")
-                            store.put(key, df, format='table', data_columns=True)
-                        logger.info(f"Saved {indicator_type} for {symbol} ({timeframe}) to {resolved_path}, rows: {len(df)}")
-                        if file_path.exists():
-                            file_size = os.path.getsize(file_path)
-                            logger.info(f"Verified {resolved_path}: Size {file_size} bytes")
-                        else:
-                            logger.error(f"File {resolved_path} not found after save")
-                        break
-                    except Exception as e:
-                        logger.warning(f"Attempt {attempt}/3 failed for {resolved_path}: {e}")
-                        if attempt == 3:
-                            logger.error(f"Failed to save {indicator_type} data for {symbol}: {e}")
-                        time.sleep(2)
+            self._write_store(file_path, lambda store: self._put_indicators(store, symbol, df, timeframe, indicator_type),
+                              f"{indicator_type} data for {symbol}")
+
+    def _put_indicators(self, store: pd.HDFStore, symbol: str, df: pd.DataFrame, timeframe: str, indicator_type: str):
+        key = symbol.replace(":", "_")
+        if f"/{key}" in store:
+            existing_df = store[key]
+            if 'timestamp' in existing_df.columns:
+                existing_df['timestamp'] = pd.to_datetime(existing_df['timestamp'], utc=True, errors='coerce').dt.tz_convert('Asia/Kolkata')
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(f"Existing data timestamp range: {existing_df['timestamp'].min()} to {existing_df['timestamp'].max()}")
+                if (df['timestamp'].min() <= existing_df['timestamp'].min() and 
+                    df['timestamp'].max() >= existing_df['timestamp'].max()):
+                    logger.info(f"New data covers existing range for {symbol} ({timeframe}, {indicator_type}). Overwriting.")
+                else:
+                    combined_df = pd.concat([existing_df, df], ignore_index=True)
+                    rows = len(combined_df)
+                    combined_df = combined_df.drop_duplicates(subset=['timestamp'], keep='last')
+                    if len(combined_df) < rows:
+                        logger.warning(f"Removed {rows - len(combined_df)} duplicates for {symbol} ({timeframe}, {indicator_type})")
+                        combined_df = combined_df.sort_values('timestamp')
+                    df = combined_df
+                    if df.empty:
+                        logger.info(f"No data after deduplication for {symbol} ({timeframe}, {indicator_type})")
+                        return
+            else:
+                logger.warning(f"No timestamp column in existing data for {symbol} ({timeframe}, {indicator_type})")
+        _write_table(store, key, _downcast_ohlcv(df))
+        logger.info(f"Saved {indicator_type} for {symbol} ({timeframe}) to {store.filename}, rows: {len(df)}")
 
     def trim_old_data(self, symbol: str, timeframe: str, retention_days: int):
         file_path = self.historical_path / f"{timeframe}.h5"
+        if not file_path.exists():
+            logger.debug(f"File {file_path.resolve()} does not exist")
+            return
+        self._write_store(file_path, lambda store: self._trim_key(store, symbol, timeframe, retention_days),
+                          f"trimmed data for {symbol}")
+
+    def _trim_key(self, store: pd.HDFStore, symbol: str, timeframe: str, retention_days: int):
         key = symbol.replace(":", "_")
-        resolved_path = file_path.resolve()
-        try:
-            if file_path.exists():
-                with pd.HDFStore(resolved_path, mode='a') as store:
-                    if f"/{key}" in store:
-                        df = store[key]
-                        if df is not None and not df.empty and "timestamp" in df.columns:
-                            df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True, errors='coerce').dt.tz_convert('Asia/Kolkata')
-                            cutoff = pd.Timestamp.now(tz='Asia/Kolkata') - pd.Timedelta(days=retention_days)
-                            df = df[df["timestamp"] > cutoff]
-                            store.put(key, df, format='table', data_columns=True)
-                            logger.info(f"Trimmed data for {symbol} ({timeframe}) before {cutoff}")
-                        else:
-                            logger.warning(f"No valid timestamp data for {symbol} ({timeframe})")
-                    else:
-                        logger.debug(f"No data to trim for {symbol} ({timeframe})")
-            else:
-                logger.debug(f"File {resolved_path} does not exist")
-        except Exception as e:
-            logger.error(f"Error trimming data for {symbol}: {e}")
\ No newline at end of file
+        if f"/{key}" not in store:
+            logger.debug(f"No data to trim for {symbol} ({timeframe})")
+            return
+        df = store[key]
+        if df is not None and not df.empty and "timestamp" in df.columns:
+            df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True, errors='coerce').dt.tz_convert('Asia/Kolkata')
+            cutoff = pd.Timestamp.now(tz='Asia/Kolkata') - pd.Timedelta(days=retention_days)
+            df = df[df["timestamp"] > cutoff]
+            _write_table(store, key, df)
+            logger.info(f"Trimmed data for {symbol} ({timeframe}) before {cutoff}")
+        else:
+            logger.warning(f"No valid timestamp data for {symbol} ({timeframe})")
\ No newline at end of file
@@ -0,0 +1,88 @@
+import threading
+import numpy as np
+from typing import Dict, List
+from src.utils.logger import get_logger
+from config.config import TICK_RING_CAPACITY
+
+logger = get_logger(__name__)
+
+class TickRing:
+    """Fixed-capacity structure-of-arrays tick buffer shared by every subscribed symbol.
+
+    The WebSocket thread writes with put(); the resampler takes everything unread with drain().
+    The reader never locks: writers fill a slot before publishing it by advancing head, and the
+    reader frees slots by advancing tail only after copying them out. Writers (the socket thread
+    and the occasional REST fallback) serialize on a lock the reader never takes.
+    When the buffer is full new ticks are dropped and counted rather than overwriting unread ones.
+    """
+    def __init__(self, symbols: List[str], capacity: int = TICK_RING_CAPACITY):
+        self.symbols = list(symbols)
+        self.sym_id = {symbol: i for i, symbol in enumerate(self.symbols)}
+        if capacity <= 0 or capacity & (capacity - 1):
+            raise ValueError(f"TickRing capacity must be a power of two, got {capacity}")
+        self.capacity = capacity
+        self._mask = capacity - 1  # slot = counter & mask
+        self.ts = np.empty(capacity, dtype=np.int64)
+        self.ltp = np.empty(capacity, dtype=np.float64)
+        self.volume = np.empty(capacity, dtype=np.int64)
+        self.last_qty = np.empty(capacity, dtype=np.int64)
+        self.sym = np.empty(capacity, dtype=np.int32)
+        self.head = 0  # total ticks written; only writers advance it
+        self.tail = 0  # total ticks consumed; only the reader advances it
+        self.dropped = 0
+        self.write_lock = threading.Lock()
+
+    def put(self, symbol: str, timestamp: int, ltp: float, volume: int, last_qty: int = 0) -> bool:
+        """Append one tick stamped in epoch nanoseconds; returns False for unknown symbols or a full buffer."""
+        sid = self.sym_id.get(symbol)
+        if sid is None:
+            return False
+        return self.put_id(sid, timestamp, ltp, volume, last_qty)
+
+    def put_id(self, sid: int, timestamp: int, ltp: float, volume: int, last_qty: int = 0) -> bool:
+        """put() for callers that already hold the symbol's integer id; returns False when full."""
+        with self.write_lock:
+            head = self.head
+            if head - self.tail >= self.capacity:
+                self.dropped += 1
+                return False
+            i = head & self._mask
+            self.ts[i] = timestamp
+            self.ltp[i] = ltp
+            self.volume[i] = volume
+            self.last_qty[i] = last_qty
+            self.sym[i] = sid
+            self.head = head + 1  # publish only after the slot is filled
+        return True
+
+    def _unread(self, column: np.ndarray, tail: int, head: int) -> np.ndarray:
+        """Copy slots [tail, head) of column, stitching the two halves when the range wraps."""
+        start, stop = tail & self._mask, head & self._mask
+        if head - tail == 0:
+            return column[:0].copy()
+        if start < stop:
+            return column[start:stop].copy()
+        return np.concatenate((column[start:], column[:stop]))
+
+    def drain(self) -> Dict[str, np.ndarray]:
+        """Remove and return all unread ticks in arrival order as parallel arrays."""
+        tail, head = self.tail, self.head
+        batch = {
+            "sym": self._unread(self.sym, tail, head),
+            "timestamp": self._unread(self.ts, tail, head),
+            "ltp": self._unread(self.ltp, tail, head),
+            "volume": self._unread(self.volume, tail, head),
+            "last_qty": self._unread(self.last_qty, tail, head),
+        }
+        self.tail = head  # release the slots only once they are copied out
+        return batch
+
+    def pending(self, symbol: str) -> int:
+        """Number of unread ticks for symbol."""
+        sid = self.sym_id.get(symbol)
+        if sid is None:
+            return 0
+        return int(np.count_nonzero(self._unread(self.sym, self.tail, self.head) == sid))
+
+    def __len__(self) -> int:
+        return self.head - self.tail
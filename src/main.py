@@ -47,13 +47,13 @@ def display_menu():
 
 async def run_historical_backfill():
     try:
-        backfill = Backfill()
-        lookback_days = int(input("Enter lookback days (max 100, default 7): ") or 7)
-        if lookback_days > 100:
-            logger.warning("Lookback capped at 100 days due to API limits.")
-            lookback_days = 100
-        logger.info(f"Starting historical backfill for {lookback_days} days.")
-        await backfill.backfill_all(lookback_days=lookback_days, today_only=False)
+        with await Backfill.create() as backfill:
+            lookback_days = int(input("Enter lookback days (max 100, default 7): ") or 7)
+            if lookback_days > 100:
+                logger.warning("Lookback capped at 100 days due to API limits.")
+                lookback_days = 100
+            logger.info(f"Starting historical backfill for {lookback_days} days.")
+            await backfill.backfill_all(lookback_days=lookback_days, today_only=False)
         logger.info("Historical backfill completed.")
     except Exception as e:
         logger.error(f"Historical backfill failed: {e}", exc_info=True)
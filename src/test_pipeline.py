@@ -1,10 +1,13 @@
 import asyncio
 import time
 import pandas as pd
-import queue
 from datetime import datetime, timedelta
 import pytz
 from nsepython import nse_quote
+try:
+    import uvloop
+except ImportError:  # uvloop is optional; the default asyncio loop works the same, just slower
+    uvloop = None
 from src.data_pipeline.fyers_websocket import FyersWebSocketClient
 from src.data_pipeline.resampler import Resampler
 from src.data_pipeline.storage import Storage
@@ -69,8 +72,11 @@ def validate_ohlcv(symbol, ohlcv_df):
         return False
 
 async def test_pipeline(override_market_check: bool = False, test_symbol: str = "NSE:RELIANCE-EQ"):
+    with await Backfill.create() as backfill:
+        await _run_test_pipeline(backfill, override_market_check, test_symbol)
+
+async def _run_test_pipeline(backfill: Backfill, override_market_check: bool, test_symbol: str):
     storage = Storage()
-    backfill = Backfill()
     symbols = [test_symbol] if test_symbol else pd.read_csv(SYMBOLS_FILE)["symbol"].tolist()
 
     # Pre-market historical validation (9:00 AM)
@@ -91,11 +97,11 @@ async def test_pipeline(override_market_check: bool = False, test_symbol: str =
         return
 
     ws = FyersWebSocketClient()
-    resampler = Resampler(ws.tick_queues, storage)
+    resampler = Resampler(ws.ticks, storage)
 
     try:
-        # Start WebSocket in a separate thread
-        ws_task = asyncio.create_task(asyncio.to_thread(ws.start))
+        # Start WebSocket and its tick watchdog
+        ws_task = asyncio.create_task(ws.start())
         # Start Resampler
         resampler_task = asyncio.create_task(resampler.start())
         
@@ -103,18 +109,10 @@ async def test_pipeline(override_market_check: bool = False, test_symbol: str =
         for i in range(300):  # Run for 5 minutes
             await asyncio.sleep(1)
             for symbol in symbols:
-                queue_size = ws.tick_queues[symbol].qsize()
-                ohlcv_df = resampler.ohlcv_data[symbol]["1s"]
+                queue_size = ws.ticks.pending(symbol)
+                bars = resampler.second_bars[symbol]
                 if queue_size > 0:
-                    queue_contents = []
-                    temp_queue = queue.Queue()
-                    while not ws.tick_queues[symbol].empty():
-                        item = ws.tick_queues[symbol].get()
-                        queue_contents.append(item)
-                        temp_queue.put(item)
-                    while not temp_queue.empty():
-                        ws.tick_queues[symbol].put(temp_queue.get())
-                    logger.info(f"{symbol}: Queue size = {queue_size}, OHLCV rows = {len(ohlcv_df)}, Queue contents = {queue_contents}")
+                    logger.info(f"{symbol}: Queue size = {queue_size}, OHLCV rows = {len(bars)}")
                 
                 if i % 30 == 0:
                     if queue_size == 0:
@@ -124,19 +122,20 @@ async def test_pipeline(override_market_check: bool = False, test_symbol: str =
                         quotes = ws.fetch_quote_fallback(batch)
                         for quote in quotes:
                             if quote and quote["symbol"] == symbol:
-                                ws.tick_queues[symbol].put(quote)
+                                ws.put_quote(quote)
                                 logger.info(f"Fallback quote for {symbol}: {quote}")
+                    ohlcv_df = bars.as_dataframe()
                     if not ohlcv_df.empty and validate_ohlcv(symbol, ohlcv_df):
                         logger.info(f"{symbol} validated successfully")
                     else:
                         logger.warning(f"{symbol} validation failed or no data")
 
-        total_rows = sum(len(resampler.ohlcv_data[symbol]["1s"]) for symbol in ws.tick_queues)
+        total_rows = sum(len(resampler.second_bars[symbol]) for symbol in ws.symbols)
         if total_rows == 0:
             logger.warning("No real-time data received. Running backfill.")
             await backfill.backfill_all(lookback_days=1)
 
-        for symbol in ws.tick_queues:
+        for symbol in ws.symbols:
             for tf in ["15s", "30s", "1min", "3min", "5min"]:
                 ohlcv_df = resampler.ohlcv_data[symbol][tf]
                 if not ohlcv_df.empty:
@@ -162,4 +161,6 @@ async def test_pipeline(override_market_check: bool = False, test_symbol: str =
         logger.info("Pipeline shutdown complete")
 
 if __name__ == "__main__":
+    if uvloop is not None:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
     asyncio.run(test_pipeline())
\ No newline at end of file
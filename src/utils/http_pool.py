@@ -0,0 +1,46 @@
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from fyers_apiv3 import fyersModel
+
+
+class _PooledRequests:
+    """
+    Stand-in for the requests module inside the Fyers SDK.
+    get/post/patch/delete go through one keep-alive Session; everything else (HTTPError, ...) is the real module.
+    """
+    def __init__(self, session: requests.Session):
+        self._session = session
+
+    def __getattr__(self, name):
+        return getattr(requests, name)
+
+    def get(self, url, **kwargs):
+        return self._session.get(url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self._session.post(url, **kwargs)
+
+    def patch(self, url, **kwargs):
+        return self._session.patch(url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self._session.delete(url, **kwargs)
+
+
+_lock = threading.Lock()
+
+
+def pool_fyers_http(pool_maxsize: int):
+    """
+    Route the Fyers SDK's synchronous REST calls through a shared pooled Session.
+    The SDK calls requests.get/post directly, which opens a new TLS connection per call.
+    pool_maxsize: Connections kept alive per host; match the number of threads issuing calls
+    """
+    with _lock:
+        if isinstance(fyersModel.requests, _PooledRequests):
+            return
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize)
+        session.mount("https://", adapter)
+        fyersModel.requests = _PooledRequests(session)
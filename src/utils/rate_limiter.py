@@ -0,0 +1,35 @@
+import asyncio
+import time
+
+
+class AsyncRateLimiter:
+    """
+    Token-bucket limiter shared by concurrent coroutines.
+    max_rate: Requests allowed per time_period seconds
+    """
+    def __init__(self, max_rate: float, time_period: float = 1.0):
+        self.max_rate = max_rate
+        self.time_period = time_period
+        self._tokens = max_rate
+        self._last = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.max_rate, self._tokens + (now - self._last) * self.max_rate / self.time_period)
+        self._last = now
+
+    async def acquire(self):
+        async with self._lock:
+            self._refill()
+            while self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) * self.time_period / self.max_rate)
+                self._refill()
+            self._tokens -= 1
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
@@ -0,0 +1,9 @@
+import random
+
+
+def backoff(attempt: int, base: float = 1.0, cap: float = 30.0) -> float:
+    """
+    Full-jitter exponential backoff delay in seconds.
+    Drawn uniformly from [0, min(cap, base * 2**attempt)] so concurrent retries do not line up.
+    """
+    return random.uniform(0, min(cap, base * 2 ** min(attempt, 32)))
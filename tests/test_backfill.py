@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import contextlib
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+from src.data_pipeline import backfill as backfill_module
+from src.data_pipeline.backfill import Backfill, _missing_runs, _missing_runs_numpy, _missing_runs_scan
+
+OPEN = "2025-06-12 09:15:00+0530"
+CLOSE = "2025-06-12 15:30:00+0530"
+
+MASKS = {
+    "all missing": ([False] * 5, [(0, 5)]),
+    "none missing": ([True] * 5, []),
+    "missing at both ends": ([False, False, True, True, False], [(0, 2), (4, 5)]),
+    "interior runs": ([True, False, True, False, False, True], [(1, 2), (3, 5)]),
+    "single bin missing": ([False], [(0, 1)]),
+    "empty": ([], []),
+}
+
+
+# _missing_runs is the numba-compiled scan when numba is installed, else the NumPy version
+RUN_FINDERS = {"numpy": _missing_runs_numpy, "scan": _missing_runs_scan, "selected": _missing_runs}
+
+
+@pytest.mark.parametrize("find_runs", RUN_FINDERS.values(), ids=RUN_FINDERS.keys())
+@pytest.mark.parametrize("mask, runs", MASKS.values(), ids=MASKS.keys())
+def test_missing_runs(find_runs, mask, runs):
+    starts, ends = find_runs(np.array(mask, dtype=bool))
+    assert list(zip(starts.tolist(), ends.tolist())) == runs
+
+
+@pytest.mark.parametrize("find_runs", [_missing_runs_scan, _missing_runs], ids=["scan", "selected"])
+def test_run_finders_agree_on_random_masks(find_runs):
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        present = rng.random(int(rng.integers(1, 400))) < rng.random()
+        expected = _missing_runs_numpy(present)
+        got = find_runs(present)
+        np.testing.assert_array_equal(got[0], expected[0])
+        np.testing.assert_array_equal(got[1], expected[1])
+
+
+def bars(*minutes):
+    start = pd.Timestamp(OPEN)
+    return pd.DataFrame({"timestamp": [start + pd.Timedelta(minutes=m) for m in minutes]})
+
+
+def check(df, timeframe="1min"):
+    return Backfill.__new__(Backfill).check_data_gaps("NSE:A", timeframe, OPEN, CLOSE, df=df)
+
+
+def test_full_session_is_one_gap_when_no_data():
+    assert check(pd.DataFrame(columns=["timestamp"])) == [{"start": OPEN, "end": CLOSE}]
+
+
+def test_complete_session_has_no_gaps():
+    assert check(bars(*range(375))) == []
+
+
+def test_gaps_at_both_ends_and_inside():
+    gaps = check(bars(*range(2, 100), *range(101, 370)))
+    assert gaps == [
+        {"start": "2025-06-12 09:15:00+0530", "end": "2025-06-12 09:17:00+0530"},
+        {"start": "2025-06-12 10:55:00+0530", "end": "2025-06-12 10:56:00+0530"},
+        {"start": "2025-06-12 15:25:00+0530", "end": "2025-06-12 15:30:00+0530"},
+    ]
+
+
+def test_bars_inside_a_window_count_as_present():
+    # One bar anywhere inside each 5min window fills it
+    assert check(bars(*range(1, 375, 5)), timeframe="5min") == []
+
+
+def test_epoch_second_timestamps_are_accepted():
+    df = bars(*range(375))
+    df["timestamp"] = df["timestamp"].astype("int64") // 1_000_000_000
+    assert check(df) == []
+
+
+class FakeQuotes:
+    """Quotes stub: batches containing a symbol in `failing` get an error response."""
+
+    def __init__(self, known, failing=()):
+        self.known, self.failing = set(known), set(failing)
+
+    def quotes(self, data):
+        batch = data["symbols"].split(",")
+        if self.failing & set(batch):
+            return {"s": "error", "message": "request limit reached"}
+        return {"s": "ok", "d": [{"n": symbol, "s": "ok" if symbol in self.known else "error"} for symbol in batch]}
+
+
+def validator(symbols, fyers, cache_file, monkeypatch):
+    monkeypatch.setattr(backfill_module, "VALID_SYMBOLS_FILE", cache_file)
+    backfill = Backfill.__new__(Backfill)
+    backfill.symbols, backfill.fyers = list(symbols), fyers
+    backfill.limiter, backfill.io_pool = contextlib.nullcontext(), None
+    return backfill
+
+
+def test_validation_drops_invalid_symbols_and_caches(tmp_path, monkeypatch):
+    cache_file = tmp_path / "valid_symbols.json"
+    backfill = validator(["NSE:A", "NSE:B", "NSE:X"], FakeQuotes({"NSE:A", "NSE:B"}), cache_file, monkeypatch)
+    asyncio.run(backfill._validate_symbols())
+    assert backfill.symbols == ["NSE:A", "NSE:B"]
+    assert json.loads(cache_file.read_text())["symbols"] == ["NSE:A", "NSE:B"]
+
+
+def test_transient_failures_keep_symbols_and_skip_the_cache(tmp_path, monkeypatch):
+    cache_file = tmp_path / "valid_symbols.json"
+    fyers = FakeQuotes({"NSE:A", "NSE:B"}, failing={"NSE:B"})
+    backfill = validator(["NSE:A", "NSE:B", "NSE:X"], fyers, cache_file, monkeypatch)
+    asyncio.run(backfill._validate_symbols())
+    assert backfill.symbols == ["NSE:A", "NSE:B"]
+    assert not cache_file.exists()
+
+
+@pytest.mark.parametrize("content", ["[1, 2]", '"NSE:A"', '{"validated_at": "now", "symbols": ["NSE:A"]}', "{not json"])
+def test_malformed_symbol_cache_is_a_miss(tmp_path, monkeypatch, content):
+    cache_file = tmp_path / "valid_symbols.json"
+    cache_file.write_text(content)
+    assert validator(["NSE:A"], None, cache_file, monkeypatch)._read_symbol_cache() is None
+
+
+def test_holiday_fallback_file_resolves_outside_the_repo_root(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(backfill_module, "mcal", None)
+    holidays = backfill_module._load_nse_holidays()
+    assert np.datetime64("2026-01-26") in holidays
+
+
+def test_gap_check_leaves_the_callers_frame_untouched():
+    df = bars(*range(375))
+    df["timestamp"] = df["timestamp"].astype("int64") // 1_000_000_000
+    before = df.copy()
+    check(df)
+    pd.testing.assert_frame_equal(df, before)
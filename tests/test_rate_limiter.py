@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import time
+from src.utils.rate_limiter import AsyncRateLimiter
+
+
+async def acquire_times(limiter: AsyncRateLimiter, n: int):
+    start = time.monotonic()
+    times = []
+
+    async def one():
+        async with limiter:
+            times.append(time.monotonic() - start)
+
+    await asyncio.gather(*(one() for _ in range(n)))
+    return sorted(times)
+
+
+def test_initial_burst_is_not_delayed():
+    times = asyncio.run(acquire_times(AsyncRateLimiter(5, 0.5), 5))
+    assert times[-1] < 0.05
+
+
+def test_concurrent_callers_are_paced_to_the_rate():
+    # 5 per 0.5s: the burst of 5 is free, the next 10 need 1s of refill
+    times = asyncio.run(acquire_times(AsyncRateLimiter(5, 0.5), 15))
+    assert 0.9 <= times[-1] < 1.3
+    # After the burst each call waits for one refilled token, i.e. 0.1s apart
+    for k, t in enumerate(times[5:], start=1):
+        assert t >= k * 0.1 - 0.01
+
+
+def test_idle_time_refills_up_to_max_rate_only():
+    async def run():
+        limiter = AsyncRateLimiter(4, 0.2)
+        await acquire_times(limiter, 4)
+        await asyncio.sleep(0.5)  # long enough to refill more than max_rate tokens if uncapped
+        return await acquire_times(limiter, 6)
+    times = asyncio.run(run())
+    assert times[3] < 0.05
+    assert times[-1] >= 0.09
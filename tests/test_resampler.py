@@ -1,3 +1,107 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import asyncio
+import numpy as np
+import pandas as pd
+import pytest
+import src.data_pipeline.resampler as resampler_module
+from src.data_pipeline.ohlcv_buffer import OHLCVBuffer
+from src.data_pipeline.resampler import Resampler
+from src.data_pipeline.tick_ring import TickRing
+
+T0 = 1_750_000_000 * 1_000_000_000  # epoch ns, on a whole second
+
+
+class FakeStorage:
+    def __init__(self):
+        self.saved = []
+
+    def save_ohlcv(self, symbol, df, timeframe):
+        self.saved.append((symbol, timeframe, df.copy()))
+
+    def save_ohlcv_batch(self, timeframe, frames):
+        for symbol, df in frames.items():
+            self.save_ohlcv(symbol, df, timeframe)
+
+
+@pytest.fixture
+def resampler(monkeypatch):
+    monkeypatch.setattr(resampler_module, "load_config", lambda path: {})
+    r = Resampler(TickRing(["A", "B"], capacity=64), FakeStorage())
+    return r
+
+
+def random_bars(buffer: OHLCVBuffer, n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    seconds = np.sort(rng.choice(np.arange(3600), n, replace=False))
+    for s in seconds:
+        o, c, a, b = rng.random(4) * 100
+        buffer.append(T0 + int(s) * 1_000_000_000, o, max(o, c, a), min(o, c, b), c, int(rng.integers(1, 1000)))
+
+
+def test_buffer_replaces_bar_with_same_timestamp():
+    buffer = OHLCVBuffer(capacity=4)
+    buffer.append(T0, 1.0, 2.0, 0.5, 1.5, 10)
+    buffer.append(T0, 1.0, 3.0, 0.5, 2.5, 20)
+    assert len(buffer) == 1
+    df = buffer.as_dataframe()
+    assert df[["high", "close", "volume"]].iloc[0].tolist() == [3.0, 2.5, 20]
+    assert str(df["timestamp"].dt.tz) == "Asia/Kolkata"
+
+
+def test_buffer_overwrites_oldest_bars_when_full():
+    buffer = OHLCVBuffer(capacity=4)
+    for k in range(6):
+        buffer.append(T0 + k, float(k), float(k), float(k), float(k), k)
+    ts, open_, *_ = buffer.columns()
+    assert ts.tolist() == [T0 + k for k in range(2, 6)]
+    assert open_.tolist() == [2.0, 3.0, 4.0, 5.0]
+    assert buffer.columns(last=2)[0].tolist() == [T0 + 4, T0 + 5]
+
+
+def test_aggregate_ticks_builds_one_second_bars(resampler):
+    for k, (symbol, ltp, volume) in enumerate([("A", 10.0, 100), ("B", 20.0, 5), ("A", 12.0, 101), ("A", 9.0, 104)]):
+        resampler.ticks.put(symbol, T0 + k * 1000, ltp, volume)
+    asyncio.run(resampler.aggregate_ticks())
+    bar = resampler.second_bars["A"].as_dataframe().iloc[0]
+    assert [bar["open"], bar["high"], bar["low"], bar["close"], bar["volume"]] == [10.0, 12.0, 9.0, 9.0, 104]
+    assert len(resampler.second_bars["B"]) == 1
+    assert sorted((symbol, tf) for symbol, tf, _ in resampler.storage.saved) == [("A", "1s"), ("B", "1s")]
+
+
+@pytest.mark.parametrize("timeframe", ["15s", "30s", "1min", "3min", "5min"])
+def test_resample_matches_pandas(resampler, timeframe):
+    bars = resampler.second_bars["A"]
+    random_bars(bars, 900)
+    got = asyncio.run(resampler.resample_to_timeframe("A", timeframe, save=False))
+    expected = (
+        bars.as_dataframe().set_index("timestamp").resample(timeframe)
+        .agg({"open": "first", "high": "max", "low": "min", "close": "last", "volume": "sum"})
+        .dropna()
+    )
+    pd.testing.assert_frame_equal(got, expected, check_freq=False, check_dtype=False)
+    assert resampler.storage.saved == []
+
+
+def test_resample_covers_only_bars_left_after_wrap(monkeypatch):
+    monkeypatch.setattr(resampler_module, "load_config", lambda path: {})
+    r = Resampler(TickRing(["A"], capacity=4), FakeStorage())
+    r.second_bars["A"] = OHLCVBuffer(capacity=64)
+    random_bars(r.second_bars["A"], 200, seed=1)
+    got = asyncio.run(r.resample_to_timeframe("A", "1min", save=False))
+    assert got.index.is_monotonic_increasing
+    assert got["volume"].sum() == r.second_bars["A"].columns()[5].sum()
+
+
+def test_process_can_run_again_after_stop(resampler, monkeypatch):
+    computed = []
+    monkeypatch.setattr(resampler, "compute_indicators", lambda symbol, tf: computed.append((symbol, tf)))
+
+    async def one_pass():
+        resampler.stop()  # the loop finishes the current pass, then exits
+
+    monkeypatch.setattr(resampler, "aggregate_ticks", one_pass)
+    for _ in range(2):
+        asyncio.run(resampler.process())
+    assert len(computed) == 2 * len(resampler.symbols) * len(resampler.timeframes)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+import pytest
+from src.data_pipeline import storage as storage_module
+from src.data_pipeline.storage import FLOAT32_PRICE_LIMIT, Storage, _downcast_ohlcv
+
+
+@pytest.fixture
+def storage(tmp_path):
+    # Storage.__init__ points at the author's Windows data directory; aim the instance at tmp_path
+    s = Storage.__new__(Storage)
+    s.historical_path = tmp_path
+    s.indicators_path = tmp_path / "indicators"
+    s.csv_debug = False
+    s.lock = storage_module._HDF5_LOCK
+    return s
+
+
+def candles(start: str, periods: int, price: float = 1234.55, volume: int = 1000) -> pd.DataFrame:
+    ts = pd.date_range(start, periods=periods, freq="1min", tz="Asia/Kolkata")
+    return pd.DataFrame({
+        "timestamp": ts,
+        "open": price, "high": price + 0.1, "low": price - 0.1, "close": price,
+        "volume": np.full(periods, volume, dtype=np.int64),
+    })
+
+
+def test_downcast_narrows_values_that_fit():
+    df = _downcast_ohlcv(candles("2025-01-01 09:15", 3))
+    assert (df[["open", "high", "low", "close"]].dtypes == np.float32).all()
+    assert df["volume"].dtype == np.int32
+
+
+def test_downcast_keeps_wide_dtypes_when_values_do_not_fit():
+    df = _downcast_ohlcv(candles("2025-01-01 09:15", 3, price=FLOAT32_PRICE_LIMIT + 0.05, volume=3_000_000_000))
+    assert df["open"].dtype == np.float64
+    assert df["volume"].dtype == np.int64
+
+
+def test_float32_prices_round_trip_to_the_paisa(storage):
+    prices = np.round(np.linspace(0.01, FLOAT32_PRICE_LIMIT - 0.01, 500), 2)
+    df = candles("2025-01-01 09:15", len(prices))
+    df["open"] = df["high"] = df["low"] = df["close"] = prices
+    storage.save_historical("NSE:A", df, "1min")
+    loaded = storage.load_historical("NSE:A", "1min")
+    assert loaded["close"].dtype == np.float32
+    np.testing.assert_array_equal(np.round(loaded["close"].to_numpy(np.float64), 2), prices)
+
+
+def test_newer_rows_append_with_stored_dtypes(storage):
+    storage.save_historical("NSE:A", candles("2025-01-01 09:15", 5), "1min")
+    storage.save_historical("NSE:A", candles("2025-01-01 09:20", 5, price=1300.25), "1min")
+    loaded = storage.load_historical("NSE:A", "1min")
+    assert len(loaded) == 10
+    assert loaded["timestamp"].is_monotonic_increasing
+    assert loaded["close"].dtype == np.float32 and loaded["volume"].dtype == np.int32
+    assert loaded["close"].iloc[-1] == pytest.approx(1300.25, abs=0.005)
+
+
+def test_append_that_does_not_fit_widens_the_table(storage):
+    storage.save_historical("NSE:A", candles("2025-01-01 09:15", 5), "1min")
+    storage.save_historical("NSE:A", candles("2025-01-01 09:20", 2, price=300000.05, volume=3_000_000_000), "1min")
+    loaded = storage.load_historical("NSE:A", "1min")
+    assert len(loaded) == 7
+    assert loaded["close"].dtype == np.float64 and loaded["volume"].dtype == np.int64
+    assert loaded["close"].iloc[-1] == 300000.05
+    assert loaded["volume"].iloc[-1] == 3_000_000_000
+    assert loaded["close"].iloc[0] == pytest.approx(1234.55, abs=0.005)
+
+
+def test_overlapping_save_merges_and_keeps_latest_rows(storage):
+    storage.save_historical("NSE:A", candles("2025-01-01 09:15", 5), "1min")
+    storage.save_historical("NSE:A", candles("2025-01-01 09:17", 5, price=999.5), "1min")
+    loaded = storage.load_historical("NSE:A", "1min")
+    assert len(loaded) == 7
+    assert not loaded["timestamp"].duplicated().any()
+    assert loaded.set_index("timestamp")["close"].iloc[2:].tolist() == [999.5] * 5
+
+
+def test_load_timestamps_limits_the_range(storage):
+    storage.save_historical("NSE:A", candles("2025-01-01 09:15", 10), "1min")
+    start = pd.Timestamp("2025-01-01 09:17", tz="Asia/Kolkata")
+    end = pd.Timestamp("2025-01-01 09:20", tz="Asia/Kolkata")
+    df = storage.load_timestamps("NSE:A", "1min", start, end)
+    assert len(df) == 3
+    assert df["timestamp"].min() == start
+
+
+def test_ohlcv_batch_save_downcasts_each_symbol(storage):
+    storage.save_ohlcv_batch("1min", {"NSE:A": candles("2025-01-01 09:15", 3), "NSE:B": candles("2025-01-01 09:15", 4)})
+    assert len(storage.load_historical("NSE:A", "1min")) == 3
+    b = storage.load_historical("NSE:B", "1min")
+    assert len(b) == 4 and b["open"].dtype == np.float32
+
+
+def test_newer_ohlcv_bars_append_without_rewriting_the_key(storage, monkeypatch):
+    rewrites = []
+    write_table = storage_module._write_table
+    monkeypatch.setattr(storage_module, "_write_table", lambda store, key, df: (rewrites.append(key), write_table(store, key, df)))
+    bars = candles("2025-01-01 09:15", 5)
+    for i in range(5):
+        storage.save_ohlcv_batch("1s", {"NSE:A": bars.iloc[[i]].reset_index(drop=True)})
+    assert rewrites == ["NSE_A"]  # only the first save creates the table
+    assert len(storage.load_historical("NSE:A", "1s")) == 5
+
+
+def test_ohlcv_bar_for_a_stored_second_replaces_it(storage):
+    storage.save_ohlcv("NSE:A", candles("2025-01-01 09:15", 3), "1s")
+    storage.save_ohlcv("NSE:A", candles("2025-01-01 09:17", 1, price=1500.5), "1s")
+    loaded = storage.load_historical("NSE:A", "1s")
+    assert len(loaded) == 3
+    assert loaded["close"].iloc[-1] == pytest.approx(1500.5, abs=0.005)
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+from src.data_pipeline.tick_ring import TickRing
+
+
+def test_drain_returns_ticks_in_arrival_order():
+    ring = TickRing(["A", "B"], capacity=8)
+    ring.put("A", 1, 10.0, 100, 1)
+    ring.put("B", 2, 20.0, 200, 2)
+    ring.put("A", 3, 11.0, 101, 3)
+    batch = ring.drain()
+    assert batch["sym"].tolist() == [0, 1, 0]
+    assert batch["timestamp"].tolist() == [1, 2, 3]
+    assert batch["ltp"].tolist() == [10.0, 20.0, 11.0]
+    assert batch["volume"].tolist() == [100, 200, 101]
+    assert batch["last_qty"].tolist() == [1, 2, 3]
+    assert len(ring) == 0
+    assert ring.drain()["sym"].size == 0
+
+
+def test_unknown_symbol_is_rejected():
+    ring = TickRing(["A"], capacity=4)
+    assert not ring.put("Z", 1, 1.0, 1)
+    assert len(ring) == 0 and ring.dropped == 0
+
+
+def test_drain_stitches_a_wrapped_range():
+    ring = TickRing(["A"], capacity=4)
+    for ts in range(3):
+        ring.put("A", ts, float(ts), ts)
+    ring.drain()
+    # Slots 3, 0, 1, 2: the unread range now crosses the end of the arrays
+    for ts in range(3, 7):
+        assert ring.put("A", ts, float(ts), ts)
+    batch = ring.drain()
+    assert batch["timestamp"].tolist() == [3, 4, 5, 6]
+    assert batch["ltp"].tolist() == [3.0, 4.0, 5.0, 6.0]
+
+
+def test_full_ring_drops_new_ticks_instead_of_overwriting():
+    ring = TickRing(["A"], capacity=4)
+    for ts in range(4):
+        assert ring.put("A", ts, float(ts), ts)
+    assert not ring.put("A", 99, 99.0, 99)
+    assert ring.dropped == 1
+    assert ring.drain()["timestamp"].tolist() == [0, 1, 2, 3]
+    # Draining frees the slots again
+    assert ring.put("A", 4, 4.0, 4)
+    assert ring.drain()["timestamp"].tolist() == [4]
+
+
+def test_pending_counts_unread_ticks_per_symbol():
+    ring = TickRing(["A", "B"], capacity=4)
+    ring.put("A", 1, 1.0, 1)
+    ring.put("B", 2, 2.0, 2)
+    ring.put("A", 3, 3.0, 3)
+    assert ring.pending("A") == 2
+    assert ring.pending("B") == 1
+    assert ring.pending("Z") == 0
+
+
+def test_put_id_matches_put():
+    ring = TickRing(["A", "B"], capacity=4)
+    assert ring.put_id(ring.sym_id["B"], 5, 1.5, 7, 2)
+    batch = ring.drain()
+    assert batch["sym"].tolist() == [1]
+    np.testing.assert_array_equal(batch["last_qty"], [2])
+
+
+@pytest.mark.parametrize("capacity", [0, 3, 6, 1000])
+def test_capacity_must_be_a_power_of_two(capacity):
+    with pytest.raises(ValueError):
+        TickRing(["A"], capacity=capacity)